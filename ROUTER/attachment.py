@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, status, HTTPException, Header, Query, Request
+from typing import List, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+import schemas, database, oauth2, models, conditional, attachments
+
+router = APIRouter(prefix="/notes", tags=["Attachments"])
+
+UPLOAD_BODY = {"requestBody": {"required": True, "content": {
+    "application/octet-stream": {"schema": {"type": "string", "format": "binary"}}}}}
+DOWNLOAD_RESPONSES = {200: {"content": {"application/octet-stream": {}}},
+                      206: {"description": "Partial content for a Range request"}}
+
+
+def owned_attachment(note_id: int, attachment_id: int, user_id: int):
+    return (select(models.NoteAttachment)
+            .join(models.Notes, models.Notes.id == models.NoteAttachment.note_id)
+            .where(models.NoteAttachment.id == attachment_id,
+                   models.NoteAttachment.note_id == note_id, models.Notes.user_id == user_id))
+
+
+@router.post("/{note_id}/attachments", response_model=schemas.AttachmentOut,
+             status_code=status.HTTP_201_CREATED, openapi_extra=UPLOAD_BODY)
+async def upload_attachment(note_id: int, request: Request,
+                            filename: str = Query(..., min_length=1, max_length=255),
+                            content_type: str = Header("application/octet-stream", max_length=255),
+                            content_length: Optional[int] = Header(None),
+                            db: AsyncSession = Depends(database.get_db),
+                            current_user = Depends(oauth2.get_current_user)):
+    if content_length is not None and content_length > settings.attachment_max_size:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Attachments are limited to {settings.attachment_max_size} bytes")
+
+    note = await db.scalar(select(models.Notes.id).filter_by(id=note_id, user_id=current_user.id))
+    if not note:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Note with id: {note_id} not found")
+    # Give the connection back while the body streams in; attach() starts a new transaction.
+    await db.rollback()
+
+    attachment = await attachments.attach(db, note_id, filename, content_type, request.stream())
+    if attachment is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Note with id: {note_id} not found")
+    return attachment
+
+@router.get("/{note_id}/attachments", response_model=List[schemas.AttachmentOut])
+async def get_attachments(note_id: int, db: AsyncSession = Depends(database.get_db),
+                          current_user = Depends(oauth2.get_current_user)):
+
+    note = await db.scalar(select(models.Notes.id).filter_by(id=note_id, user_id=current_user.id))
+    if not note:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Note with id: {note_id} not found")
+    return (await db.scalars(select(models.NoteAttachment).filter_by(note_id=note_id)
+                             .order_by(models.NoteAttachment.id))).all()
+
+@router.get("/{note_id}/attachments/{attachment_id}", response_class=attachments.BlobResponse,
+            responses=DOWNLOAD_RESPONSES)
+async def download_attachment(note_id: int, attachment_id: int, request: Request,
+                              db: AsyncSession = Depends(database.get_db),
+                              current_user = Depends(oauth2.get_current_user)):
+
+    attachment = await db.scalar(owned_attachment(note_id, attachment_id, current_user.id))
+    if not attachment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Attachment with id: {attachment_id} not found")
+    etag = attachments.etag(attachment)
+    if conditional.is_fresh(request, etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers={"ETag": etag, "Cache-Control": attachments.CACHE_CONTROL})
+    response = await attachments.response(attachment)
+    if response is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Attachment with id: {attachment_id} not found")
+    return response
+
+@router.delete("/{note_id}/attachments/{attachment_id}", response_model=schemas.Deletion)
+async def delete_attachment(note_id: int, attachment_id: int,
+                            db: AsyncSession = Depends(database.get_db),
+                            current_user = Depends(oauth2.get_current_user)):
+
+    attachment = await db.scalar(owned_attachment(note_id, attachment_id, current_user.id))
+    if not attachment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Attachment with id: {attachment_id} not found")
+    digest = attachment.sha256
+    await db.execute(delete(models.NoteAttachment).filter_by(id=attachment_id))
+    await db.commit()
+    await attachments.release(db, [digest])
+    return {"detail": "Attachment deleted successfully"}
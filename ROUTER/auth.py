@@ -1,18 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 import database, models, schemas, utils, oauth2
 
 router = APIRouter(prefix="/user", tags=["Authencation"])
 
 @router.post("/login", response_model=schemas.Token)
-def login(user: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user_exist = db.query(models.Users).filter(models.Users.email == user.username).first()
+async def login(user: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_db)):
+    user_exist = await db.scalar(select(models.Users).where(models.Users.email == user.username))
     if not user_exist:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials")
-    is_correct_password = utils.verify(user.password, user_exist.password)
+    is_correct_password, new_hash = await utils.verify_and_update_async(user.password, 
+                                                                        user_exist.password)
     if not is_correct_password:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Credentials")
+    if new_hash:
+        # bcrypt cost changed since this hash was made; upgrade it while we have the password.
+        await db.execute(update(models.Users).filter_by(id=user_exist.id).values(password=new_hash))
+        await db.commit()
     
     token_data = {"user_id":user_exist.id}
     access_token = oauth2.create_access_token(token_data)
@@ -22,7 +28,7 @@ def login(user: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(dat
 
 
 @router.post("/refresh", response_model=schemas.RefreshToken)
-def refresh_token(user = Depends(oauth2.get_current_user_from_refresh)):
+async def refresh_token(user = Depends(oauth2.get_current_user_from_refresh)):
     
     token_data = {"user_id": user.id}
     new_access_token = oauth2.create_access_token(token_data)
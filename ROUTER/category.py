@@ -1,70 +1,103 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-import schemas, database, oauth2, models
+from fastapi import APIRouter, Depends, status, HTTPException, Response
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import schemas, database, oauth2, models, conditional, serialization, changefeed
+from pagination import PageParams, paginate, NOTE_ORDER, CATEGORY_ORDER
+from projection import columns_for
 
 router = APIRouter(prefix="/category", tags=["Categories"])
 
+CATEGORY_LIST_COLUMNS = columns_for(models.NoteCategory, schemas.AllCategoryOut, *CATEGORY_ORDER)
+NOTE_LIST_COLUMNS = columns_for(models.Notes, schemas.AllNoteOut, *NOTE_ORDER)
+DIALECT_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
 
-@router.post("/create")
-def create_category(category: schemas.CategoryCreated, db: Session = Depends(database.get_db), 
-                    current_user = Depends(oauth2.get_current_user)):
-    existing_category = db.query(models.NoteCategory).filter_by(category_name= category.category_name, 
-                                                                user_id = current_user.id).first()
-    if existing_category:
+
+@router.post("/create", response_model=schemas.CategoryOut)
+async def create_category(category: schemas.CategoryCreated, db: AsyncSession = Depends(database.get_db), 
+                          current_user = Depends(oauth2.get_current_user)):
+    # One round trip, and no race between the existence check and the insert.
+    insert = DIALECT_INSERT[db.bind.dialect.name]
+    new_category = await db.scalar(insert(models.NoteCategory)
+                                   .values(user_id=current_user.id, 
+                                           category_name=category.category_name)
+                                   .on_conflict_do_nothing(index_elements=["user_id", "category_name"])
+                                   .returning(models.NoteCategory))
+    if not new_category:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, 
                             detail="Category already exists")
-    new_category = models.NoteCategory(user_id=current_user.id, 
-                                       category_name=category.category_name)
-    db.add(new_category)
-    db.commit()
-    db.refresh(new_category)
+    changefeed.publish(db, current_user.id, "category.created", new_category.id)
+    await db.commit()
+    if db.bind.dialect.name == "sqlite":
+        # SQLite's RETURNING does not see the change_seq set by the AFTER trigger.
+        await db.refresh(new_category, ["change_seq"])
     return new_category
 
-@router.get("/all", response_model=List[schemas.AllCategoryOut])
-def get_categories(db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
+@router.get("/all", response_model=schemas.Page[schemas.AllCategoryOut], 
+            dependencies=[Depends(conditional.check_collection)])
+async def get_categories(response: Response, page: PageParams = Depends(), 
+                         db: AsyncSession = Depends(database.get_db), 
+                         current_user = Depends(oauth2.get_current_user)):
     
-   categories = db.query(models.NoteCategory).filter_by(user_id=current_user.id).all()
-   return categories
+   categories_query = select(*CATEGORY_LIST_COLUMNS).filter_by(user_id=current_user.id)
+   categories = await paginate(db, categories_query, CATEGORY_ORDER, page)
+   return serialization.page_response(schemas.AllCategoryOut, categories, response)
 
-@router.get("/{category_id}", response_model=List[schemas.AllNoteOut])
-def get_category_note(category_id: int, db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
+@router.get("/{category_id}", response_model=schemas.Page[schemas.AllNoteOut], 
+            dependencies=[Depends(conditional.check_collection)])
+async def get_category_note(category_id: int, response: Response, page: PageParams = Depends(), 
+                            db: AsyncSession = Depends(database.get_db), 
+                            current_user = Depends(oauth2.get_current_user)):
     
-    category = db.query(models.NoteCategory).filter_by(id = category_id, 
-                                                      user_id = current_user.id).first()
+    category = await db.scalar(select(models.NoteCategory).filter_by(id = category_id, 
+                                                                     user_id = current_user.id))
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                             detail="Category doesn't exist") 
-    notes = category.note
-    return notes
+    notes_query = select(*NOTE_LIST_COLUMNS).filter_by(user_id=current_user.id, category_id=category.id)
+    notes = await paginate(db, notes_query, NOTE_ORDER, page, descending=True)
+    return serialization.page_response(schemas.AllNoteOut, notes, response)
 
 
-@router.put("/edit/{category_id}")
-def edit_category(category_id: int, category: schemas.EditCategory, db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
+@router.put("/edit/{category_id}", response_model=schemas.CategoryOut)
+async def edit_category(category_id: int, category: schemas.EditCategory, 
+                        db: AsyncSession = Depends(database.get_db), 
+                        current_user = Depends(oauth2.get_current_user)):
 
-    category_query = db.query(models.NoteCategory).filter_by(id=category_id, user_id=current_user.id)
-    editing_category = category_query.first()
-    if not editing_category:
+    try:
+        edited_category = await db.scalar(update(models.NoteCategory)
+                                           .filter_by(id=category_id, user_id=current_user.id)
+                                           .where(models.NoteCategory.category_name != "Uncategorized")
+                                           .values(**category.model_dump())
+                                           .returning(models.NoteCategory))
+    except IntegrityError:
+        # uq_note_categories_user_id_category_name: the user already has that name.
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, 
+                            detail="Category already exists")
+    if not edited_category:
+        # Nothing matched: only now pay for a lookup to tell "missing" from "default".
+        if await db.scalar(select(models.NoteCategory.id).filter_by(id=category_id, 
+                                                                    user_id=current_user.id)):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, 
+                                detail="Cannot edit default category")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category doesn't exist")
     
-    if editing_category.category_name == "Uncategorized":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot edit default category")
-
-    category_query.update(category.model_dump(), synchronize_session=False)
-    db.commit()
-    edited_category = category_query.first()
+    changefeed.publish(db, current_user.id, "category.updated", category_id)
+    await db.commit()
+    if db.bind.dialect.name == "sqlite":
+        # SQLite's RETURNING does not see the change_seq set by the AFTER trigger.
+        await db.refresh(edited_category, ["change_seq"])
     return edited_category
 
 
 @router.delete("/delete/{category_id}", response_model=schemas.Deletion)
-def delete_category(category_id:int, db: Session = Depends(database.get_db), 
-                    current_user = Depends(oauth2.get_current_user)):
+async def delete_category(category_id:int, db: AsyncSession = Depends(database.get_db), 
+                          current_user = Depends(oauth2.get_current_user)):
 
-    category_query = db.query(models.NoteCategory).filter_by(id=category_id, user_id=current_user.id)
-    category = category_query.first()
+    category = await db.scalar(select(models.NoteCategory).filter_by(id=category_id, 
+                                                                     user_id=current_user.id))
     
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category doesn't exist")
@@ -72,6 +105,7 @@ def delete_category(category_id:int, db: Session = Depends(database.get_db),
     if category.category_name == "Uncategorized":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot delete default category")
    
-    category_query.delete(synchronize_session=False)
-    db.commit()
+    await db.execute(delete(models.NoteCategory).filter_by(id=category_id, user_id=current_user.id))
+    changefeed.publish(db, current_user.id, "category.deleted", category_id)
+    await db.commit()
     return {"detail": "Category deleted successfully"}
\ No newline at end of file
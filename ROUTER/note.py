@@ -1,113 +1,294 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-import schemas, database, oauth2, models
+from fastapi import (APIRouter, Depends, status, HTTPException, Query, Request, Response, Header, 
+                     WebSocket)
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import undefer
+from sqlalchemy.ext.asyncio import AsyncSession
+import schemas, database, oauth2, models, search, batch, export, importer, conditional, serialization
+import changefeed, revisions, content_patch, attachments
+from pagination import PageParams, paginate, NOTE_ORDER
+from projection import columns_for
 
 router = APIRouter(prefix="/notes", tags=["Notes"])
 
+IMPORT_BODY = {"requestBody": {"required": True, "content": {
+    "application/x-ndjson": {"schema": {"type": "string", "format": "binary"}},
+    "text/csv": {"schema": {"type": "string", "format": "binary"}}}}}
+
+NOTE_LIST_COLUMNS = columns_for(models.Notes, schemas.AllNoteOut, *NOTE_ORDER)
+REVISION_ORDER = [models.NoteRevision.revision]
+REVISION_LIST_COLUMNS = columns_for(models.NoteRevision, schemas.RevisionOut, *REVISION_ORDER)
+
 
 @router.post("/create", response_model=schemas.NoteOut, status_code=status.HTTP_201_CREATED)
-def create_note(note: schemas.NoteCreated, db: Session = Depends(database.get_db),
-                current_user = Depends(oauth2.get_current_user)):
+async def create_note(note: schemas.NoteCreated, db: AsyncSession = Depends(database.get_db),
+                      current_user = Depends(oauth2.get_current_user)):
     
-    existing_category = db.query(models.NoteCategory).filter_by(
-                        id=note.category_id, user_id=current_user.id).first()
+    existing_category = await db.scalar(select(models.NoteCategory).filter_by(
+                        id=note.category_id, user_id=current_user.id))
 
     if not existing_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category doesn't exist")
         
     new_note = models.Notes(user_id=current_user.id, **note.model_dump())
     db.add(new_note)
-    db.commit()
-    db.refresh(new_note)
+    await db.flush()
+    changefeed.publish(db, current_user.id, "note.created", new_note.id)
+    await db.commit()
     return new_note
 
+
+@router.post("/batch", response_model=schemas.BatchOut)
+async def batch_notes(payload: schemas.NoteBatch, db: AsyncSession = Depends(database.get_db),
+                      current_user = Depends(oauth2.get_current_user)):
+    
+    results = await batch.apply_batch(db, current_user.id, payload.operations)
+    return {"results": results}
+
+@router.post("/import", response_model=schemas.ImportReport, openapi_extra=IMPORT_BODY)
+async def import_notes(request: Request, format: Literal["ndjson", "csv"] = "ndjson", 
+                       db: AsyncSession = Depends(database.get_db),
+                       current_user = Depends(oauth2.get_current_user)):
+    # Give the connection back while the body streams in; the import starts a new transaction.
+    await db.rollback()
+    return await importer.import_notes(db, current_user.id, request.stream(), format)
         
-@router.get("/all", response_model=List[schemas.AllNoteOut])
-def get_all_notes(db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
+@router.get("/all", response_model=schemas.Page[schemas.AllNoteOut], 
+            dependencies=[Depends(conditional.check_collection)])
+async def get_all_notes(response: Response, page: PageParams = Depends(), 
+                        db: AsyncSession = Depends(database.get_db), 
+                        current_user = Depends(oauth2.get_current_user)):
     
-   notes = db.query(models.Notes).filter_by(user_id=current_user.id).all()
-   return notes
+   notes_query = select(*NOTE_LIST_COLUMNS).filter_by(user_id=current_user.id)
+   notes = await paginate(db, notes_query, NOTE_ORDER, page, descending=True)
+   return serialization.page_response(schemas.AllNoteOut, notes, response)
 
-@router.get("/uncategorized", response_model=List[schemas.AllNoteOut])
-def get_uncategorized(db: Session = Depends(database.get_db), current_user = Depends(oauth2.get_current_user)):
+@router.get("/uncategorized", response_model=schemas.Page[schemas.AllNoteOut], 
+            dependencies=[Depends(conditional.check_collection)])
+async def get_uncategorized(response: Response, page: PageParams = Depends(), 
+                            db: AsyncSession = Depends(database.get_db), 
+                            current_user = Depends(oauth2.get_current_user)):
     
-    uncategorized_category = db.query(models.NoteCategory).filter_by(
-        user_id=current_user.id, category_name="Uncategorized").first()
+    uncategorized_category = await db.scalar(select(models.NoteCategory).filter_by(
+        user_id=current_user.id, category_name="Uncategorized"))
     
     if not uncategorized_category:
-        return []  # fallback, just in case
+        notes = {"items": [], "next_cursor": None}  # fallback, just in case
+        return serialization.page_response(schemas.AllNoteOut, notes, response)
+
+    notes_query = select(*NOTE_LIST_COLUMNS).filter_by(user_id=current_user.id, 
+                                                 category_id=uncategorized_category.id)
+    notes = await paginate(db, notes_query, NOTE_ORDER, page, descending=True)
+    return serialization.page_response(schemas.AllNoteOut, notes, response)
+
+@router.get("/bookmarks", response_model=schemas.Page[schemas.AllNoteOut], 
+            dependencies=[Depends(conditional.check_collection)])
+async def get_bookmark(response: Response, page: PageParams = Depends(), 
+                       db: AsyncSession = Depends(database.get_db), 
+                       current_user = Depends(oauth2.get_current_user)):
+    
+    notes_query = select(*NOTE_LIST_COLUMNS).filter_by(bookmark=True, user_id=current_user.id)
+    notes = await paginate(db, notes_query, NOTE_ORDER, page, descending=True)
+    return serialization.page_response(schemas.AllNoteOut, notes, response)
 
-    uncategorized_notes = uncategorized_category.notes
-    return uncategorized_notes
+@router.get("/search", response_model=schemas.Page[schemas.NoteSearchHit])
+async def search_notes(q: str = Query(..., min_length=1, max_length=256), page: PageParams = Depends(), 
+                       db: AsyncSession = Depends(database.get_db), 
+                       current_user = Depends(oauth2.get_current_user)):
+    
+    hits = await search.search_notes(db, current_user.id, q, page)
+    return serialization.page_response(schemas.NoteSearchHit, hits)
 
-@router.get("/bookmarks", response_model=List[schemas.AllNoteOut])
-def get_bookmark(db: Session = Depends(database.get_db), 
-                 current_user = Depends(oauth2.get_current_user)):
+@router.get("/export", response_class=StreamingResponse)
+async def export_notes(format: Literal["ndjson", "csv"] = "ndjson", gzip: bool = False, 
+                       current_user = Depends(oauth2.get_current_user)):
     
-    notes = db.query(models.Notes).filter_by(bookmark=True, user_id=current_user.id).all()
-    return notes
+    filename = f"notes.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else export.MEDIA_TYPES[format]
+    return StreamingResponse(export.export_notes(current_user.id, format, compress=gzip), 
+                             media_type=media_type, 
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_changes(current_user = Depends(oauth2.get_current_user)):
+    # Server-Sent Events: note.* and category.* changes as they commit, "resync"
+    # when the client has to catch up through /sync/changes instead.
+    return StreamingResponse(changefeed.sse_events(current_user.id), 
+                             media_type=changefeed.MEDIA_TYPE, 
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+@router.websocket("/stream/ws")
+async def stream_changes_ws(websocket: WebSocket, 
+                            current_user = Depends(oauth2.get_current_user_from_websocket)):
+    await websocket.accept()
+    await changefeed.websocket_events(websocket, current_user.id)
 
 @router.get("/{note_id}", response_model=schemas.NoteOut)
-def get_note(note_id: int, db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
+async def get_note(note_id: int, request: Request, response: Response, 
+                   db: AsyncSession = Depends(database.get_db), 
+                   current_user = Depends(oauth2.get_current_user)):
     
-    note = db.query(models.Notes).filter_by(id = note_id, user_id = current_user.id).first()
+    if conditional.is_conditional(request):
+        # Revalidation: decide on the version columns before loading the content.
+        version = (await db.execute(select(models.Notes.change_seq, models.Notes.date_modified)
+                                    .filter_by(id = note_id, user_id = current_user.id))).first()
+        if version:
+            etag = conditional.note_etag(note_id, version.change_seq)
+            if conditional.is_fresh(request, etag, version.date_modified):
+                raise conditional.not_modified(etag, version.date_modified)
+
+    note = await db.scalar(select(models.Notes).filter_by(id = note_id, user_id = current_user.id)
+                           .options(undefer(models.Notes.content)))
     if not note:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                            detail=f"Note with id: {note_id} not found")
+    response.headers.update(conditional.validators(conditional.note_etag(note.id, note.change_seq), 
+                                                   note.date_modified))
     return note
 
+@router.get("/{note_id}/revisions", response_model=schemas.Page[schemas.RevisionOut])
+async def get_revisions(note_id: int, page: PageParams = Depends(), 
+                        db: AsyncSession = Depends(database.get_db), 
+                        current_user = Depends(oauth2.get_current_user)):
+    
+    if not await db.scalar(select(models.Notes.id).filter_by(id = note_id, user_id = current_user.id)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
+                            detail=f"Note with id: {note_id} not found")
+    revisions_query = select(*REVISION_LIST_COLUMNS).filter_by(note_id = note_id)
+    note_revisions = await paginate(db, revisions_query, REVISION_ORDER, page, descending=True)
+    return serialization.page_response(schemas.RevisionOut, note_revisions)
+
+@router.get("/{note_id}/revisions/{revision}", response_model=schemas.RevisionDetail)
+async def get_revision(note_id: int, revision: int, db: AsyncSession = Depends(database.get_db), 
+                       current_user = Depends(oauth2.get_current_user)):
+    
+    if not await db.scalar(select(models.Notes.id).filter_by(id = note_id, user_id = current_user.id)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
+                            detail=f"Note with id: {note_id} not found")
+    note_revision = await revisions.load(db, note_id, revision)
+    if not note_revision:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
+                            detail=f"Revision {revision} of note {note_id} not found")
+    return note_revision
+
 @router.put("/edit/{note_id}", response_model=schemas.NoteOut)
-def edit_note(note_id: int, note: schemas.EditNote, db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
+async def edit_note(note_id: int, note: schemas.EditNote, response: Response, 
+                    if_match: Optional[str] = Header(None), 
+                    db: AsyncSession = Depends(database.get_db), 
+                    current_user = Depends(oauth2.get_current_user)):
+    
+    expected_change_seq = conditional.expected_change_seq(if_match, note_id)
+    changes = note.model_dump(exclude_unset=True, exclude_none=True)
+    if changes:
+        statement = update(models.Notes).filter_by(id = note_id, user_id = current_user.id)
+        if expected_change_seq is not None:
+            statement = statement.filter_by(change_seq = expected_change_seq)
+        # Also brings back the version being replaced, for the revision history.
+        edited_note, previous = await revisions.update_note(
+            db, statement.values(**changes).returning(models.Notes)
+                         .options(undefer(models.Notes.content)),
+            note_id, current_user.id)
+        if edited_note:
+            await revisions.record(db, note_id, previous, edited_note)
+            changefeed.publish(db, current_user.id, "note.updated", note_id)
+        await db.commit()
+    else:
+        statement = select(models.Notes).filter_by(id = note_id, user_id = current_user.id)
+        if expected_change_seq is not None:
+            statement = statement.filter_by(change_seq = expected_change_seq)
+        edited_note = await db.scalar(statement.options(undefer(models.Notes.content)))
     
-    note_query = db.query(models.Notes).filter_by(id = note_id, user_id = current_user.id)
-    editing_note = note_query.first()
-    if not editing_note:
+    if not edited_note:
+        if expected_change_seq is not None and await db.scalar(
+                select(models.Notes.id).filter_by(id = note_id, user_id = current_user.id)):
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, 
+                                detail="Note has been modified")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                            detail=f"Note with id: {note_id} not found")
-        
-    note_query.update(note.model_dump(exclude_unset=True), synchronize_session=False)
-    db.commit()
-    edited_note = note_query.first()
+    if changes and db.bind.dialect.name == "sqlite":
+        # SQLite's RETURNING does not see the change_seq set by the AFTER trigger.
+        await db.refresh(edited_note, ["change_seq"])
+    response.headers.update(conditional.validators(
+        conditional.note_etag(edited_note.id, edited_note.change_seq), edited_note.date_modified))
     return edited_note
 
 
+@router.patch("/{note_id}/content", response_model=schemas.NoteVersion)
+async def patch_note_content(note_id: int, patch: schemas.ContentPatch, response: Response, 
+                             if_match: Optional[str] = Header(None), 
+                             db: AsyncSession = Depends(database.get_db), 
+                             current_user = Depends(oauth2.get_current_user)):
+    # Offsets only mean something against a known version, so If-Match is required.
+    expected_change_seq = conditional.expected_change_seq(if_match, note_id)
+    if expected_change_seq is None:
+        raise HTTPException(status_code=status.HTTP_428_PRECONDITION_REQUIRED, 
+                            detail="If-Match with the note's ETag is required")
+
+    note = (await db.execute(select(models.Notes.title, models.Notes.content, models.Notes.change_seq)
+                             .filter_by(id = note_id, user_id = current_user.id)
+                             .with_for_update())).first()
+    if not note:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
+                            detail=f"Note with id: {note_id} not found")
+    if note.change_seq != expected_change_seq:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, 
+                            detail="Note has been modified")
+
+    content = content_patch.apply_ops(note.content, patch.ops)
+    patched_note = await db.scalar(update(models.Notes)
+                                   .filter_by(id = note_id, user_id = current_user.id)
+                                   .values(content=content).returning(models.Notes))
+    await revisions.record(db, note_id, note, revisions.Version(note.title, content))
+    changefeed.publish(db, current_user.id, "note.updated", note_id)
+    await db.commit()
+    if db.bind.dialect.name == "sqlite":
+        # SQLite's RETURNING does not see the change_seq set by the AFTER trigger.
+        await db.refresh(patched_note, ["change_seq"])
+    response.headers.update(conditional.validators(
+        conditional.note_etag(note_id, patched_note.change_seq), patched_note.date_modified))
+    return {"id": note_id, "change_seq": patched_note.change_seq, "content_length": len(content), 
+            "date_modified": patched_note.date_modified}
+
+
 @router.delete("/delete/{note_id}", response_model=schemas.Deletion)
-def delete_note(note_id:int, db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
+async def delete_note(note_id:int, db: AsyncSession = Depends(database.get_db), 
+                      current_user = Depends(oauth2.get_current_user)):
     
-    note_query = db.query(models.Notes).filter_by(id = note_id, user_id=current_user.id)
-    note = note_query.first()
+    note = await db.scalar(select(models.Notes.id).filter_by(id = note_id, user_id=current_user.id))
     
     if not note:
        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                            detail=f"Note with id: {note_id} not found")
    
-    note_query.delete(synchronize_session=False)
-    db.commit()
+    digests = await attachments.attached_digests(db, models.Notes.id == note_id)
+    await db.execute(delete(models.Notes).filter_by(id = note_id, user_id=current_user.id))
+    changefeed.publish(db, current_user.id, "note.deleted", note_id)
+    await db.commit()
+    await attachments.release(db, digests)
     return {"detail": "Note deleted successfully"}
     
 @router.put("/bookmark/{note_id}", response_model=schemas.BookmarkNote)
-def toggle_bookmark(note_id: int, db: Session = Depends(database.get_db), 
-                  current_user = Depends(oauth2.get_current_user)):
-    note_query = db.query(models.Notes).filter_by(id=note_id, user_id=current_user.id)
-    note = note_query.first()
-    if not note:
+async def toggle_bookmark(note_id: int, db: AsyncSession = Depends(database.get_db), 
+                          current_user = Depends(oauth2.get_current_user)):
+    bookmarked_note = await db.scalar(update(models.Notes)
+                                      .filter_by(id=note_id, user_id=current_user.id)
+                                      .values(bookmark=~models.Notes.bookmark)
+                                      .returning(models.Notes)
+                                      .options(undefer(models.Notes.content)))
+    if not bookmarked_note:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                             detail=f"Note with id: {note_id} not found")
-    note_query.update({"bookmark": not note.bookmark}, synchronize_session=False)
-    db.commit()
-    bookmarked_note = note_query.first()
+    changefeed.publish(db, current_user.id, "note.updated", note_id)
+    await db.commit()
     return bookmarked_note
 
 @router.put("/category/{note_id}/{category_id}", response_model=schemas.CategorizedNote)
-def categorize(note_id: int, category_id: int, db: Session = Depends(database.get_db), 
-               current_user = Depends(oauth2.get_current_user)):
+async def categorize(note_id: int, category_id: int, db: AsyncSession = Depends(database.get_db), 
+                     current_user = Depends(oauth2.get_current_user)):
 
-    note = db.query(models.Notes).filter_by(id=note_id, user_id=current_user.id).first()
+    note = await db.scalar(select(models.Notes).filter_by(id=note_id, user_id=current_user.id)
+                           .options(undefer(models.Notes.content)))
     if not note:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                             detail=f"Note with id: {note_id} not found")
@@ -116,13 +297,13 @@ def categorize(note_id: int, category_id: int, db: Session = Depends(database.ge
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, 
                             detail="Note already in category")
 
-    category = db.query(models.NoteCategory).filter_by(id=category_id, 
-                                                       user_id=current_user.id).first()
+    category = await db.scalar(select(models.NoteCategory).filter_by(id=category_id, 
+                                                                     user_id=current_user.id))
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, 
                             detail="Category doesn't exist")
 
     note.category_id = category_id
-    db.commit()
-    db.refresh(note) 
+    changefeed.publish(db, current_user.id, "note.updated", note_id)
+    await db.commit()
     return note
\ No newline at end of file
@@ -1,29 +1,25 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, FastAPI, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.routing import APIRoute
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from database import get_db
+import database, metrics
+from health import database_health, writer_health, primary_checks
 
 router = APIRouter(tags=["Roots"])
 
+
+def build_route_catalogue(app: FastAPI) -> list:
+    return [{"path": route.path, "methods": sorted(route.methods), "name": route.name}
+            for route in app.routes if isinstance(route, APIRoute)]
+
+
 @router.get("/")
-def root(request: Request, db: Session = Depends(get_db)):
+async def root(request: Request):
     
-    try:
-        db.execute(text("SELECT 1"))
+    failing = next((check for check in primary_checks() if check.status != "ok"), None)
+    if failing is None:
         db_status = "Connected"
-    except Exception as e:
-        db_status = f"Error: {str(e)}"
-
-    
-    routes_info = []
-    for route in request.app.routes: 
-        if isinstance(route, APIRoute):
-            routes_info.append({
-                "path": route.path,
-                "methods": list(route.methods),
-                "name": route.name
-            })
+    else:
+        db_status = f"Error: {failing.detail or failing.status}"
 
     return {
         "name": "Note App API",
@@ -32,6 +28,28 @@ def root(request: Request, db: Session = Depends(get_db)):
         "redoc": "/redoc",
         "version": "1.0.0",
         "database_status": db_status,
-        "routes": routes_info,
+        "routes": request.app.state.route_catalogue,
         "status": "Note API is up and running"
     }
+
+@router.get("/healthz")
+async def liveness():
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readiness():
+    # Replicas only add capacity: reads fail over to the primary, so they don't
+    # decide readiness.
+    body = {"ready": all(check.ready for check in primary_checks()),
+            "database": database_health.snapshot(),
+            "replicas": {replica.name: dict(replica.health.snapshot(), available=replica.available)
+                         for replica in database.replicas}}
+    if writer_health is not None:
+        body["writer"] = writer_health.snapshot()
+    if not body["ready"]:
+        return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return body
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import schemas, database, oauth2, changes, serialization
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+
+@router.get("/changes", response_model=schemas.SyncChanges)
+async def get_changes(since: Optional[str] = None, limit: int = Query(500, ge=1, le=5000), 
+                      db: AsyncSession = Depends(database.get_db), 
+                      current_user = Depends(oauth2.get_current_user)):
+    
+    changed = await changes.get_changes(db, current_user.id, since, limit)
+    return serialization.json_response(serialization.dump_json(schemas.SyncChanges, changed))
\ No newline at end of file
@@ -1,64 +1,80 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import database, models, schemas, utils, oauth2
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import attachments, cache, database, models, schemas, utils, oauth2
 
 router = APIRouter(prefix="/user", tags=["Account Creation"])
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED, response_model=schemas.UserOut)
-def create_account(user: schemas.UserCreated, db: Session = Depends(database.get_db)):
+async def create_account(user: schemas.UserCreated, db: AsyncSession = Depends(database.get_db)):
     
-    existing_user = db.query(models.Users).filter_by(email = user.email).first()
+    existing_user = await db.scalar(select(models.Users).filter_by(email = user.email))
     if existing_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, 
                             detail="An account with this email already exists")
-    hashed_password = utils.hash(user.password)
+    hashed_password = await utils.hash_async(user.password)
     user.password = hashed_password
     new_user = models.Users(**user.model_dump(),
                             note_categories=[models.NoteCategory
                                              (category_name="Uncategorized")])
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.flush()
+    # The account exists only on the primary until replicas catch up; keep the new
+    # user's first requests there.
+    db.info["user_id"] = new_user.id
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.get("/view/me", response_model=schemas.UserOut)
-def get_user(current_user = Depends(oauth2.get_current_user)):
+async def get_user(current_user = Depends(oauth2.get_current_user)):
    
     return current_user
 
 @router.put("/edit/me", response_model=schemas.UserOut)
-def edit_user(user: schemas.UserEdit, db: Session = Depends(database.get_db),
-             current_user = Depends(oauth2.get_current_user)):
-    query = db.query(models.Users).filter_by(id = current_user.id)
-    query.update(user.model_dump(exclude_unset=True), synchronize_session=False)
-    db.commit()
-    return query.first()
+async def edit_user(user: schemas.UserEdit, db: AsyncSession = Depends(database.get_db),
+                    current_user = Depends(oauth2.get_current_user)):
+    changes = user.model_dump(exclude_unset=True, exclude_none=True)
+    if not changes:
+        return current_user
+    edited_user = await db.scalar(update(models.Users).filter_by(id = current_user.id)
+                                  .values(**changes).returning(models.Users))
+    await db.commit()
+    await cache.principal_cache.invalidate(current_user.id)
+    return edited_user
 
 @router.delete("/delete/me", response_model=schemas.Deletion)
-def delete_me(db: Session = Depends(database.get_db), current_user = Depends(oauth2.get_current_user)):
-    query = db.query(models.Users).filter_by(id = current_user.id)
-    query.delete(synchronize_session=False)
-    db.commit()
+async def delete_me(db: AsyncSession = Depends(database.get_db), 
+                    current_user = Depends(oauth2.get_current_user)):
+    digests = await attachments.attached_digests(db, models.Notes.user_id == current_user.id)
+    await db.execute(delete(models.Users).filter_by(id = current_user.id))
+    await db.commit()
+    await cache.principal_cache.invalidate(current_user.id)
+    await attachments.release(db, digests)
     return {"detail": "Account successfully deleted"}
 
 @router.put("/change-password", response_model=schemas.PasswordUpdate)
-def change_password(payload: schemas.ChangePassword, 
-                    db: Session = Depends(database.get_db), 
-                    current_user = Depends(oauth2.get_current_user)):
+async def change_password(payload: schemas.ChangePassword, 
+                          db: AsyncSession = Depends(database.get_db), 
+                          current_user = Depends(oauth2.get_current_user)):
 
-    if not utils.verify(payload.current_password, current_user.password):
+    hashed_password = await db.scalar(select(models.Users.password).filter_by(id = current_user.id))
+    if not await utils.verify_async(payload.current_password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Current password is incorrect"
         )
     
-    if utils.verify(payload.new_password, current_user.password):
+    if await utils.verify_async(payload.new_password, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="New password cannot be the same as the current password"
         )
 
-    current_user.password = utils.hash(payload.new_password)
-    db.commit()
+    new_hashed_password = await utils.hash_async(payload.new_password)
+    await db.execute(update(models.Users).filter_by(id = current_user.id)
+                     .values(password=new_hashed_password))
+    await db.commit()
+    await cache.principal_cache.invalidate(current_user.id)
 
     return {"detail": "Password updated successfully"}
\ No newline at end of file
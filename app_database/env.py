@@ -5,16 +5,17 @@ from sqlalchemy import pool
 
 from alembic import context
 from models import Base
-from config import settings
+from database import SYNC_DRIVERS, database_url
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
-config.set_main_option("sqlalchemy.url",     f"postgresql://{settings.database_username}:"
-                                             f"{settings.database_password}@"
-                                             f"{settings.database_hostname}:"
-                                             f"{settings.database_port}/"
-                                             f"{settings.database_name}")
+# The app's own URL with a blocking driver; "%" is doubled for ConfigParser.
+url = database_url(SYNC_DRIVERS)
+config.set_main_option("sqlalchemy.url",
+                       url.render_as_string(hide_password=False).replace("%", "%%"))
+# SQLite can't ALTER most things in place; batch mode rebuilds the table instead.
+render_as_batch = url.get_backend_name() == "sqlite"
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -27,6 +28,17 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Search objects are created outside the ORM metadata (see models.POSTGRES_SEARCH_DDL),
+# so keep autogenerate from proposing to drop them.
+SEARCH_OBJECTS = {"search_vector", "ix_notes_search_vector"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if reflected and compare_to is None:
+        if name in SEARCH_OBJECTS or name.startswith("notes_fts"):
+            return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -51,6 +63,8 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
+        render_as_batch=render_as_batch,
     )
 
     with context.begin_transaction():
@@ -72,7 +86,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object, render_as_batch=render_as_batch,
         )
 
         with context.begin_transaction():
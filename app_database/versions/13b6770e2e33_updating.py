@@ -21,7 +21,9 @@ depends_on: Union[str, Sequence[str], None] = None
 def upgrade() -> None:
     """Upgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    op.alter_column('notes', 'category_id',
+    # Batch mode: SQLite can only change a column's nullability by rebuilding the table.
+    with op.batch_alter_table('notes') as batch_op:
+        batch_op.alter_column('category_id',
                existing_type=sa.INTEGER(),
                nullable=False)
     # ### end Alembic commands ###
@@ -30,7 +32,8 @@ def upgrade() -> None:
 def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    op.alter_column('notes', 'category_id',
+    with op.batch_alter_table('notes') as batch_op:
+        batch_op.alter_column('category_id',
                existing_type=sa.INTEGER(),
                nullable=True)
     # ### end Alembic commands ###
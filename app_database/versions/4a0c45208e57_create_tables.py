@@ -18,6 +18,14 @@ branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
 
+def utcnow():
+    # now(); SQLite gets it in the text format SQLAlchemy writes datetimes in. Kept
+    # here rather than imported from models so this revision never changes.
+    if op.get_context().dialect.name == "sqlite":
+        return sa.text("(strftime('%Y-%m-%d %H:%M:%f000', 'now'))")
+    return sa.text("now()")
+
+
 def upgrade() -> None:
     """Upgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
@@ -26,7 +34,7 @@ def upgrade() -> None:
     sa.Column('username', sa.String(), nullable=False),
     sa.Column('email', sa.String(), nullable=False),
     sa.Column('password', sa.String(), nullable=False),
-    sa.Column('date_created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('date_created', sa.DateTime(timezone=True), server_default=utcnow(), nullable=False),
     sa.PrimaryKeyConstraint('id'),
     sa.UniqueConstraint('email')
     )
@@ -43,9 +51,9 @@ def upgrade() -> None:
     sa.Column('title', sa.String(), nullable=False),
     sa.Column('content', sa.String(), nullable=False),
     sa.Column('category_id', sa.Integer(), nullable=True),
-    sa.Column('date_created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
-    sa.Column('date_modified', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
-    sa.Column('bookmark', sa.Boolean(), server_default='false', nullable=False),
+    sa.Column('date_created', sa.DateTime(timezone=True), server_default=utcnow(), nullable=False),
+    sa.Column('date_modified', sa.DateTime(timezone=True), server_default=utcnow(), nullable=False),
+    sa.Column('bookmark', sa.Boolean(), server_default=sa.false(), nullable=False),
     sa.ForeignKeyConstraint(['category_id'], ['note_categories.id'], ondelete='SET NULL'),
     sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
     sa.PrimaryKeyConstraint('id')
@@ -0,0 +1,56 @@
+"""note search index
+
+Revision ID: 7c1e9f2a5b3d
+Revises: 13b6770e2e33
+Create Date: 2026-10-18 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e9f2a5b3d'
+down_revision: Union[str, Sequence[str], None] = '13b6770e2e33'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, content='notes', "
+                   "content_rowid='id', tokenize='porter unicode61')")
+        op.execute("CREATE TRIGGER notes_fts_ai AFTER INSERT ON notes BEGIN "
+                   "INSERT INTO notes_fts(rowid, title, content) "
+                   "VALUES (new.id, new.title, new.content); END")
+        op.execute("CREATE TRIGGER notes_fts_ad AFTER DELETE ON notes BEGIN "
+                   "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+                   "VALUES ('delete', old.id, old.title, old.content); END")
+        op.execute("CREATE TRIGGER notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN "
+                   "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+                   "VALUES ('delete', old.id, old.title, old.content); "
+                   "INSERT INTO notes_fts(rowid, title, content) "
+                   "VALUES (new.id, new.title, new.content); END")
+        op.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+        return
+
+    op.execute("ALTER TABLE notes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+               "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+               "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED")
+    op.create_index('ix_notes_search_vector', 'notes', ['search_vector'], 
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS notes_fts_ai")
+        op.execute("DROP TABLE IF EXISTS notes_fts")
+        return
+
+    op.drop_index('ix_notes_search_vector', table_name='notes', postgresql_using='gin')
+    op.drop_column('notes', 'search_vector')
@@ -0,0 +1,58 @@
+"""note attachments
+
+Revision ID: 9a3f6c2e5b81
+Revises: e4b7d1c93f26
+Create Date: 2026-10-18 23:54:06.218304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3f6c2e5b81'
+down_revision: Union[str, Sequence[str], None] = 'e4b7d1c93f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def utcnow():
+    # now(); SQLite gets it in the text format SQLAlchemy writes datetimes in. Kept
+    # here rather than imported from models so this revision never changes.
+    if op.get_context().dialect.name == "sqlite":
+        return sa.text("(strftime('%Y-%m-%d %H:%M:%f000', 'now'))")
+    return sa.text("now()")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('attachment_blobs',
+    sa.Column('sha256', sa.String(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('date_created', sa.DateTime(timezone=True), server_default=utcnow(), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    op.create_table('note_attachments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('date_created', sa.DateTime(timezone=True), server_default=utcnow(), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['sha256'], ['attachment_blobs.sha256']),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_note_attachments_note_id', 'note_attachments', ['note_id', 'id'])
+    op.create_index('ix_note_attachments_sha256', 'note_attachments', ['sha256'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_note_attachments_sha256', table_name='note_attachments')
+    op.drop_index('ix_note_attachments_note_id', table_name='note_attachments')
+    op.drop_table('note_attachments')
+    op.drop_table('attachment_blobs')
@@ -0,0 +1,127 @@
+"""change tracking for sync
+
+Revision ID: a3f4d8e61c27
+Revises: 7c1e9f2a5b3d
+Create Date: 2026-10-18 13:47:09.118462
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f4d8e61c27'
+down_revision: Union[str, Sequence[str], None] = '7c1e9f2a5b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def utcnow():
+    # now(); SQLite gets it in the text format SQLAlchemy writes datetimes in. Kept
+    # here rather than imported from models so this revision never changes.
+    if op.get_context().dialect.name == "sqlite":
+        return sa.text("(strftime('%Y-%m-%d %H:%M:%f000', 'now'))")
+    return sa.text("now()")
+
+
+POSTGRES_TRIGGERS = [
+    """CREATE FUNCTION bump_change_seq() RETURNS trigger AS $$
+    BEGIN
+        IF (TG_OP = 'INSERT' AND NEW.change_seq <> 0) 
+           OR (TG_OP = 'UPDATE' AND NEW.change_seq <> OLD.change_seq) THEN
+            RETURN NEW;
+        END IF;
+        UPDATE users SET change_seq = change_seq + 1 WHERE id = NEW.user_id 
+            RETURNING change_seq INTO NEW.change_seq;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE FUNCTION record_tombstone() RETURNS trigger AS $$
+    DECLARE seq bigint;
+    BEGIN
+        UPDATE users SET change_seq = change_seq + 1 WHERE id = OLD.user_id 
+            RETURNING change_seq INTO seq;
+        IF FOUND THEN
+            INSERT INTO sync_tombstones (user_id, kind, entity_id, change_seq) 
+            VALUES (OLD.user_id, TG_ARGV[0], OLD.id, seq);
+        END IF;
+        RETURN OLD;
+    END $$ LANGUAGE plpgsql""",
+    "CREATE TRIGGER notes_change_seq BEFORE INSERT OR UPDATE ON notes "
+    "FOR EACH ROW EXECUTE FUNCTION bump_change_seq()",
+    "CREATE TRIGGER note_categories_change_seq BEFORE INSERT OR UPDATE ON note_categories "
+    "FOR EACH ROW EXECUTE FUNCTION bump_change_seq()",
+    "CREATE TRIGGER notes_tombstone AFTER DELETE ON notes "
+    "FOR EACH ROW EXECUTE FUNCTION record_tombstone('note')",
+    "CREATE TRIGGER note_categories_tombstone AFTER DELETE ON note_categories "
+    "FOR EACH ROW EXECUTE FUNCTION record_tombstone('category')",
+]
+
+
+def sqlite_triggers(table, kind):
+    next_seq = "UPDATE users SET change_seq = change_seq + 1 WHERE id = {row}.user_id; "
+    stamp = (f"UPDATE {table} SET change_seq = "
+             f"(SELECT change_seq FROM users WHERE id = NEW.user_id) WHERE id = NEW.id; ")
+    return [
+        f"CREATE TRIGGER {table}_change_seq_ai AFTER INSERT ON {table} "
+        f"WHEN NEW.change_seq = 0 BEGIN " + next_seq.format(row="NEW") + stamp + "END",
+        f"CREATE TRIGGER {table}_change_seq_au AFTER UPDATE ON {table} "
+        f"WHEN NEW.change_seq = OLD.change_seq BEGIN " + next_seq.format(row="NEW") + stamp + "END",
+        f"CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} "
+        f"WHEN EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id) BEGIN " 
+        + next_seq.format(row="OLD") +
+        f"INSERT INTO sync_tombstones (user_id, kind, entity_id, change_seq) "
+        f"SELECT OLD.user_id, '{kind}', OLD.id, change_seq FROM users WHERE id = OLD.user_id; END",
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('note_categories', sa.Column('change_seq', sa.BigInteger(), server_default='0', 
+                                               nullable=False))
+    op.add_column('notes', sa.Column('change_seq', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_table('sync_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.BigInteger(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=utcnow(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_note_categories_user_id_change_seq', 'note_categories', 
+                    ['user_id', 'change_seq'], unique=False)
+    op.create_index('ix_notes_user_id_change_seq', 'notes', ['user_id', 'change_seq'], unique=False)
+    op.create_index('ix_sync_tombstones_user_id_change_seq', 'sync_tombstones', 
+                    ['user_id', 'change_seq'], unique=False)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in sqlite_triggers('notes', 'note') + sqlite_triggers('note_categories', 'category'):
+            op.execute(statement)
+    else:
+        for statement in POSTGRES_TRIGGERS:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        for table in ('notes', 'note_categories'):
+            for suffix in ('change_seq_ai', 'change_seq_au', 'tombstone'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+    else:
+        for table in ('notes', 'note_categories'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq ON {table}")
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_tombstone ON {table}")
+        op.execute("DROP FUNCTION IF EXISTS bump_change_seq, record_tombstone")
+
+    op.drop_index('ix_sync_tombstones_user_id_change_seq', table_name='sync_tombstones')
+    op.drop_index('ix_notes_user_id_change_seq', table_name='notes')
+    op.drop_index('ix_note_categories_user_id_change_seq', table_name='note_categories')
+    op.drop_table('sync_tombstones')
+    op.drop_column('notes', 'change_seq')
+    op.drop_column('note_categories', 'change_seq')
+    op.drop_column('users', 'change_seq')
@@ -0,0 +1,58 @@
+"""indexes for hot queries
+
+Revision ID: c81d5b0e9a47
+Revises: a3f4d8e61c27
+Create Date: 2026-10-18 21:05:37.214690
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d5b0e9a47'
+down_revision: Union[str, Sequence[str], None] = 'a3f4d8e61c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Check-then-insert in create_category could race; fold duplicate categories into
+    # the oldest one so the unique index can be built.
+    op.execute("UPDATE notes SET category_id = ("
+               "SELECT min(keep.id) FROM note_categories dup JOIN note_categories keep "
+               "ON keep.user_id = dup.user_id AND keep.category_name = dup.category_name "
+               "WHERE dup.id = notes.category_id) "
+               "WHERE category_id IN (SELECT dup.id FROM note_categories dup "
+               "JOIN note_categories keep ON keep.user_id = dup.user_id "
+               "AND keep.category_name = dup.category_name AND keep.id < dup.id)")
+    op.execute("DELETE FROM note_categories WHERE EXISTS (SELECT 1 FROM note_categories keep "
+               "WHERE keep.user_id = note_categories.user_id "
+               "AND keep.category_name = note_categories.category_name "
+               "AND keep.id < note_categories.id)")
+
+    # Built concurrently on PostgreSQL so a live notes table stays writable.
+    with op.get_context().autocommit_block():
+        op.create_index('uq_note_categories_user_id_category_name', 'note_categories',
+                        ['user_id', 'category_name'], unique=True, postgresql_concurrently=True)
+        op.create_index('ix_notes_user_id_date_modified', 'notes',
+                        ['user_id', 'date_modified', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_notes_category_id_date_modified', 'notes',
+                        ['category_id', 'date_modified', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_notes_user_id_date_modified_bookmarked', 'notes',
+                        ['user_id', 'date_modified', 'id'], unique=False,
+                        postgresql_where=sa.text('bookmark'), sqlite_where=sa.text('bookmark = 1'),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notes_user_id_date_modified_bookmarked', table_name='notes')
+    op.drop_index('ix_notes_category_id_date_modified', table_name='notes')
+    op.drop_index('ix_notes_user_id_date_modified', table_name='notes')
+    op.drop_index('uq_note_categories_user_id_category_name', table_name='note_categories')
@@ -0,0 +1,52 @@
+"""note revisions
+
+Revision ID: e4b7d1c93f26
+Revises: c81d5b0e9a47
+Create Date: 2026-10-18 23:12:48.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7d1c93f26'
+down_revision: Union[str, Sequence[str], None] = 'c81d5b0e9a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def utcnow():
+    # now(); SQLite gets it in the text format SQLAlchemy writes datetimes in. Kept
+    # here rather than imported from models so this revision never changes.
+    if op.get_context().dialect.name == "sqlite":
+        return sa.text("(strftime('%Y-%m-%d %H:%M:%f000', 'now'))")
+    return sa.text("now()")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('note_revisions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('note_id', sa.Integer(), nullable=False),
+    sa.Column('revision', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('content', sa.String(), nullable=True),
+    sa.Column('delta', sa.String(), nullable=True),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.Column('content_length', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(), nullable=False),
+    sa.Column('date_created', sa.DateTime(timezone=True), server_default=utcnow(), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_note_revisions_note_id_revision', 'note_revisions',
+                    ['note_id', 'revision'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_note_revisions_note_id_revision', table_name='note_revisions')
+    op.drop_table('note_revisions')
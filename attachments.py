@@ -0,0 +1,173 @@
+"""Note attachments and the blob store behind them.
+
+Attachment bytes live on disk under `attachment_path`, named by their SHA-256,
+so a file attached to several notes (or by several users) is stored once. Each
+stored file has an attachment_blobs row, which note_attachments rows reference.
+
+The row is what orders uploads against cleanup: an upload writes the row before
+it moves its file into place, and cleanup deletes the row before it unlinks the
+file, each in one transaction. Whichever comes second waits for the other's row
+lock, and the foreign key stops cleanup from dropping a blob something was
+attached to in the meantime."""
+import hashlib
+import os
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional
+from uuid import uuid4
+import anyio
+from fastapi import HTTPException, status
+from sqlalchemy import delete, exists, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+from config import settings
+import models
+
+Attachment = models.NoteAttachment
+Blob = models.AttachmentBlob
+DIALECT_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+# Attachments never change, so a client may keep one for as long as it likes.
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.incoming = self.root / "incoming"
+
+    def path(self, digest: str) -> Path:
+        # Two levels of fan-out keep directories small at millions of files.
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def receive(self, chunks: AsyncIterator[bytes], max_size: int) -> tuple:
+        """Write `chunks` to a temporary file, hashing them on the way, and return
+        (digest, size, temporary path). Only one chunk is in memory at a time."""
+        await anyio.to_thread.run_sync(partial(os.makedirs, self.incoming, exist_ok=True))
+        temporary = self.incoming / uuid4().hex
+        hasher, size = hashlib.sha256(), 0
+        try:
+            async with await anyio.open_file(temporary, "wb") as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                            detail=f"Attachments are limited to {max_size} bytes")
+                    hasher.update(chunk)
+                    await file.write(chunk)
+        except BaseException:
+            await self.discard(temporary)
+            raise
+        return hasher.hexdigest(), size, temporary
+
+    def _keep(self, temporary: Path, digest: str):
+        path = self.path(digest)
+        if path.exists():
+            temporary.unlink()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temporary, path)
+
+    async def keep(self, temporary: Path, digest: str):
+        """Move a received file into place, or drop it if the blob is already stored."""
+        await anyio.to_thread.run_sync(self._keep, temporary, digest)
+
+    async def discard(self, temporary: Path):
+        await anyio.to_thread.run_sync(partial(temporary.unlink, missing_ok=True))
+
+    async def remove(self, digest: str):
+        await anyio.to_thread.run_sync(partial(self.path(digest).unlink, missing_ok=True))
+
+
+store = BlobStore(settings.attachment_path)
+
+
+class BlobResponse(FileResponse):
+    """A FileResponse that lets the server send whole files itself when it
+    supports the ASGI path send extension, as sendfile(2) with no copies through
+    the event loop. Range requests, HEAD and servers without the extension get
+    the usual chunked reads."""
+    chunk_size = 256 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if ("http.response.pathsend" not in scope.get("extensions", {})
+                or scope["method"] == "HEAD" or "range" in Headers(scope=scope)):
+            return await super().__call__(scope, receive, send)
+        if self.stat_result is None:
+            self.set_stat_headers(await anyio.to_thread.run_sync(os.stat, self.path))
+        await send({"type": "http.response.start", "status": self.status_code,
+                    "headers": self.raw_headers})
+        await send({"type": "http.response.pathsend", "path": os.fspath(self.path)})
+        if self.background is not None:
+            await self.background()
+
+
+def etag(attachment) -> str:
+    return f'"{attachment.sha256}"'
+
+
+async def response(attachment) -> Optional[BlobResponse]:
+    """The download response for an attachment, or None if its blob is gone (a
+    replica can still list an attachment deleted on the primary)."""
+    path = store.path(attachment.sha256)
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        return None
+    return BlobResponse(path, stat_result=stat_result, media_type=attachment.content_type,
+                        filename=attachment.filename,
+                        headers={"ETag": etag(attachment), "Cache-Control": CACHE_CONTROL,
+                                 "X-Content-Type-Options": "nosniff"})
+
+
+async def attach(db: AsyncSession, note_id: int, filename: str, content_type: str,
+                 chunks: AsyncIterator[bytes]) -> Optional[models.NoteAttachment]:
+    """Store an upload and attach it to a note. Returns None if the note was
+    deleted while the upload was streaming."""
+    digest, size, temporary = await store.receive(chunks, settings.attachment_max_size)
+    insert = DIALECT_INSERT[db.bind.dialect.name]
+    try:
+        # Updating the row on conflict locks it, so cleanup of this blob waits for us.
+        await db.execute(insert(Blob).values(sha256=digest, size=size)
+                         .on_conflict_do_update(index_elements=["sha256"],
+                                                set_={"size": size}))
+        attachment = Attachment(note_id=note_id, sha256=digest, filename=filename,
+                                content_type=content_type, size=size)
+        db.add(attachment)
+        await db.flush()
+        await store.keep(temporary, digest)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    finally:
+        await store.discard(temporary)
+    return attachment
+
+
+async def attached_digests(db: AsyncSession, *where) -> set:
+    """The blobs attached to the notes matching `where`; collect them before
+    deleting the notes, and `release` them after."""
+    return set(await db.scalars(select(Attachment.sha256).distinct()
+                                .join(models.Notes, models.Notes.id == Attachment.note_id)
+                                .where(*where)))
+
+
+async def release(db: AsyncSession, digests: Iterable[str]):
+    """Delete the blobs no attachment refers to any more. Run it after the
+    transaction that removed the attachments has committed."""
+    for digest in sorted(digests):
+        try:
+            released = await db.scalar(delete(Blob)
+                                       .where(Blob.sha256 == digest,
+                                              ~exists().where(Attachment.sha256 == digest))
+                                       .returning(Blob.sha256))
+            if released:
+                await store.remove(digest)
+            await db.commit()
+        except (IntegrityError, OSError):
+            # Attached again meanwhile, or the file could not go: the blob stays.
+            await db.rollback()
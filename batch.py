@@ -0,0 +1,127 @@
+from fastapi import status
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import models, schemas, changefeed, attachments
+
+NOTE_NOT_FOUND = "Note with id: {} not found"
+CATEGORY_NOT_FOUND = "Category doesn't exist"
+
+
+async def _owned_categories(db: AsyncSession, user_id: int, category_ids: set):
+    rows = (await db.execute(select(models.NoteCategory.id, models.NoteCategory.category_name).where(
+        models.NoteCategory.user_id == user_id,
+        or_(models.NoteCategory.id.in_(category_ids), 
+            models.NoteCategory.category_name == "Uncategorized")))).all()
+    uncategorized_id = next((row.id for row in rows if row.category_name == "Uncategorized"), None)
+    return {row.id for row in rows}, uncategorized_id
+
+
+async def _owned_notes(db: AsyncSession, user_id: int, note_ids: set):
+    if not note_ids:
+        return set()
+    return set((await db.scalars(select(models.Notes.id).where(
+        models.Notes.user_id == user_id, models.Notes.id.in_(note_ids)))).all())
+
+
+async def apply_batch(db: AsyncSession, user_id: int, operations: list):
+    """Apply a list of note operations in one transaction.
+
+    Ownership of every referenced note and category is checked up front with one
+    query each. Operations are then validated in order (so anything after a delete
+    of the same note is a 404) and folded into one statement per kind: a multi-row
+    INSERT ... RETURNING for creates, an executemany UPDATE for edits and
+    UPDATE ... WHERE id IN (...) for bookmarks, moves and deletes. Items that fail
+    validation are reported individually and do not abort the rest of the batch."""
+    category_ids = {op.category_id for op in operations 
+                    if op.op in ("create", "move") and op.category_id is not None}
+    note_ids = {op.note_id for op in operations if op.op != "create"}
+
+    owned_categories, uncategorized_id = await _owned_categories(db, user_id, category_ids)
+    live_notes = await _owned_notes(db, user_id, note_ids)
+
+    results = [None] * len(operations)
+    creates, create_indexes = [], []
+    edits, bookmarks, moves, deletes = {}, {}, {}, set()
+
+    for index, op in enumerate(operations):
+        if op.op == "create":
+            category_id = uncategorized_id if op.category_id is None else op.category_id
+            if category_id not in owned_categories:
+                results[index] = schemas.BatchResult(index=index, op=op.op, 
+                                                     status=status.HTTP_404_NOT_FOUND, 
+                                                     detail=CATEGORY_NOT_FOUND)
+                continue
+            creates.append({"user_id": user_id, "title": op.title, "content": op.content, 
+                            "category_id": category_id})
+            create_indexes.append(index)
+            continue
+
+        if op.note_id not in live_notes:
+            results[index] = schemas.BatchResult(index=index, op=op.op, note_id=op.note_id, 
+                                                 status=status.HTTP_404_NOT_FOUND, 
+                                                 detail=NOTE_NOT_FOUND.format(op.note_id))
+            continue
+
+        if op.op == "move" and op.category_id not in owned_categories:
+            results[index] = schemas.BatchResult(index=index, op=op.op, note_id=op.note_id, 
+                                                 status=status.HTTP_404_NOT_FOUND, 
+                                                 detail=CATEGORY_NOT_FOUND)
+            continue
+
+        if op.op == "update":
+            edits.setdefault(op.note_id, {}).update(op.model_dump(include={"title", "content"}, 
+                                                                  exclude_none=True))
+        elif op.op == "bookmark":
+            bookmarks[op.note_id] = op.bookmark
+        elif op.op == "move":
+            moves[op.note_id] = op.category_id
+        elif op.op == "delete":
+            live_notes.discard(op.note_id)
+            deletes.add(op.note_id)
+        results[index] = schemas.BatchResult(index=index, op=op.op, note_id=op.note_id, 
+                                             status=status.HTTP_200_OK)
+
+    if creates:
+        new_ids = (await db.scalars(insert(models.Notes).returning(models.Notes.id, 
+                                                                   sort_by_parameter_order=True), 
+                                    creates)).all()
+        for index, note_id in zip(create_indexes, new_ids):
+            results[index] = schemas.BatchResult(index=index, op="create", note_id=note_id, 
+                                                 status=status.HTTP_201_CREATED)
+        changefeed.publish(db, user_id, "note.created", *new_ids)
+
+    edits = [{"id": note_id, **values} for note_id, values in edits.items() 
+             if values and note_id not in deletes]
+    if edits:
+        await db.execute(update(models.Notes), edits)
+
+    for value in (True, False):
+        ids = [note_id for note_id, bookmark in bookmarks.items() 
+               if bookmark is value and note_id not in deletes]
+        if ids:
+            await db.execute(update(models.Notes).where(models.Notes.user_id == user_id, 
+                                                        models.Notes.id.in_(ids))
+                             .values(bookmark=value))
+
+    for category_id in set(moves.values()):
+        ids = [note_id for note_id, target in moves.items() 
+               if target == category_id and note_id not in deletes]
+        if ids:
+            await db.execute(update(models.Notes).where(models.Notes.user_id == user_id, 
+                                                        models.Notes.id.in_(ids))
+                             .values(category_id=category_id))
+
+    digests = set()
+    if deletes:
+        digests = await attachments.attached_digests(db, models.Notes.id.in_(deletes))
+        await db.execute(delete(models.Notes).where(models.Notes.user_id == user_id, 
+                                                    models.Notes.id.in_(deletes)))
+        changefeed.publish(db, user_id, "note.deleted", *sorted(deletes))
+
+    updated = ({edit["id"] for edit in edits} | set(bookmarks) | set(moves)) - deletes
+    if updated:
+        changefeed.publish(db, user_id, "note.updated", *sorted(updated))
+
+    await db.commit()
+    await attachments.release(db, digests)
+    return results
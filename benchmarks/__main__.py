@@ -0,0 +1,121 @@
+"""Load tests for the note API.
+
+    # in-process, fresh SQLite database seeded on the fly
+    python -m benchmarks run --scenario mixed --database-url sqlite:///bench.db
+
+    # against a running server: seed its database, then drive it from 4 processes
+    python -m benchmarks seed --users 50 --manifest bench.json
+    python -m benchmarks run --driver http --url http://localhost:8000 --manifest bench.json \\
+        --processes 4 --concurrency 16 --duration 60 --output results.json
+"""
+import argparse
+import asyncio
+import json
+from sqlalchemy import inspect
+from benchmarks import data, drivers, report
+from benchmarks.scenarios import SCENARIOS
+
+
+def bind_database(url: str):
+    """Point the app at `url` instead of the configured database. SQLite
+    schemas are created here; a Postgres database must be migrated."""
+    import changefeed, database
+
+    database.engine, database.write_engine = database.create_engines(database.database_url(url=url))
+    database.SessionLocal = database.create_sessionmaker(database.engine, database.write_engine)
+    changefeed.broker = changefeed.create_broker(database.write_engine)
+
+
+async def prepare(args):
+    """Bind the database and return accounts; the caller disposes of the
+    engines once the run is over."""
+    import database
+
+    if args.database_url:
+        bind_database(args.database_url)
+        if database.write_engine.dialect.name == "sqlite":
+            async with database.write_engine.begin() as connection:
+                # The trigger DDL is not checkfirst-aware, so only build a new file.
+                if not await connection.run_sync(lambda sync: inspect(sync).has_table("users")):
+                    await connection.run_sync(database.Base.metadata.create_all)
+    if args.manifest and args.command == "run":
+        with open(args.manifest) as manifest:
+            return json.load(manifest)
+    async with database.SessionLocal() as db:
+        return await data.seed(db, users=args.users, mean_notes=args.notes, seed=args.seed)
+
+
+async def dispose_engines():
+    import database
+
+    await database.dispose_engines()
+
+
+async def seed_database(args) -> list:
+    try:
+        return await prepare(args)
+    finally:
+        await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed = commands.add_parser("seed", help="generate users, categories and notes")
+    run = commands.add_parser("run", help="run a scenario and report latencies")
+    for command in (seed, run):
+        command.add_argument("--database-url", help="defaults to the app's configured database")
+        command.add_argument("--users", type=int, default=20)
+        command.add_argument("--notes", type=int, default=200, help="mean notes per user")
+        command.add_argument("--seed", type=int, default=1)
+        command.add_argument("--manifest", help="accounts file written by `seed`")
+
+    run.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    run.add_argument("--driver", choices=["asgi", "http"], default="asgi")
+    run.add_argument("--url", default="http://localhost:8000", help="server for --driver http")
+    run.add_argument("--processes", type=int, default=2, help="client processes for --driver http")
+    run.add_argument("--concurrency", type=int, default=16, help="virtual users per process")
+    limit = run.add_mutually_exclusive_group()
+    limit.add_argument("--requests", type=int, help="total requests (default 2000)")
+    limit.add_argument("--duration", type=float, help="seconds to run for")
+    run.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        accounts = asyncio.run(seed_database(args))
+        with open(args.manifest or "bench-manifest.json", "w") as manifest:
+            json.dump(accounts, manifest)
+        print(f"seeded {len(accounts)} users, "
+              f"{sum(len(account['note_ids']) for account in accounts)} notes")
+        return
+
+    if args.driver == "http" and not args.manifest:
+        parser.error("--driver http needs --manifest from `python -m benchmarks seed`")
+    requests = args.requests if args.requests or args.duration else 2000
+    options = {"scenario": args.scenario, "concurrency": args.concurrency, "requests": requests,
+               "duration": args.duration, "seed": args.seed}
+
+    if args.driver == "asgi":
+        import main as app_module
+
+        async def run_in_process():
+            try:
+                return await drivers.run_asgi(app_module.app, await prepare(args), **options)
+            finally:
+                await dispose_engines()
+
+        samples, wall_seconds = asyncio.run(run_in_process())
+    else:
+        with open(args.manifest) as manifest:
+            accounts = json.load(manifest)
+        samples, wall_seconds = drivers.run_http(args.url, accounts, args.processes, **options)
+
+    config = dict(options, driver=args.driver,
+                  processes=args.processes if args.driver == "http" else 1)
+    report.write_report(report.build_report(samples, wall_seconds, config), args.output)
+
+
+if __name__ == "__main__":
+    main()
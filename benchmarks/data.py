@@ -0,0 +1,73 @@
+import math
+import random
+import string
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert, select
+import models, utils
+
+BENCH_PASSWORD = "bench-password"
+WORDS = ["meeting", "notes", "project", "plan", "idea", "draft", "todo", "groceries", "recipe",
+         "travel", "budget", "review", "design", "lecture", "book", "summary", "journal",
+         "research", "fix", "release", "invoice", "workout", "garden", "weekly", "retro"]
+CATEGORY_NAMES = ["Work", "Personal", "Ideas", "Reading", "Travel", "Recipes", "Finance",
+                  "Health", "Study", "Archive", "Projects", "Journal"]
+INSERT_BATCH = 1000
+
+
+def _text(rng: random.Random, length: int) -> str:
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS) if rng.random() < 0.7 else "".join(
+            rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def content_length(rng: random.Random) -> int:
+    # Log-normal: most notes are a few hundred characters, a long tail runs to
+    # tens of kilobytes (pasted articles, meeting transcripts).
+    return min(int(rng.lognormvariate(math.log(600), 1.1)) + 1, 64_000)
+
+
+def notes_per_user(rng: random.Random, mean: int) -> int:
+    # Heavy users have many times the notes of light ones.
+    return max(1, int(rng.paretovariate(2.0) * mean / 2))
+
+
+async def seed(db, users: int = 20, mean_notes: int = 200, seed: int = 1) -> list:
+    """Insert `users` users with categories and notes; returns a manifest with
+    each user's credentials and ids for the scenarios to use."""
+    rng = random.Random(seed)
+    password_hash = utils.hash(BENCH_PASSWORD)
+    run_tag = f"{seed}-{rng.randrange(16 ** 6):06x}"
+    now = datetime.now(timezone.utc)
+
+    manifest = []
+    for index in range(users):
+        email = f"bench{index}-{run_tag}@example.com"
+        user_id = await db.scalar(insert(models.Users).values(
+            username=f"bench{index}", email=email, password=password_hash)
+            .returning(models.Users.id))
+        names = ["Uncategorized"] + rng.sample(CATEGORY_NAMES, rng.randint(2, 8))
+        category_ids = list((await db.scalars(insert(models.NoteCategory).returning(
+            models.NoteCategory.id, sort_by_parameter_order=True),
+            [{"user_id": user_id, "category_name": name} for name in names])).all())
+
+        rows = []
+        for _ in range(notes_per_user(rng, mean_notes)):
+            created = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            rows.append({"user_id": user_id, "title": _text(rng, rng.randint(8, 80)),
+                         "content": _text(rng, content_length(rng)),
+                         "category_id": rng.choice(category_ids),
+                         "bookmark": rng.random() < 0.1, "date_created": created,
+                         "date_modified": created + timedelta(seconds=rng.randint(0, 86400))})
+        for start in range(0, len(rows), INSERT_BATCH):
+            await db.execute(insert(models.Notes), rows[start:start + INSERT_BATCH])
+        note_ids = list((await db.scalars(select(models.Notes.id)
+                                          .where(models.Notes.user_id == user_id))).all())
+        await db.commit()
+        manifest.append({"email": email, "password": BENCH_PASSWORD, "user_id": user_id,
+                         "category_ids": category_ids, "note_ids": note_ids})
+    return manifest
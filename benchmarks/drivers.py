@@ -0,0 +1,80 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+from benchmarks.scenarios import SCENARIOS, VirtualUser, login, pick
+
+TRANSPORT_ERROR = 599
+
+
+async def run_users(client: httpx.AsyncClient, accounts: list, scenario: str, concurrency: int,
+                    requests: int = None, duration: float = None, seed: int = 1) -> tuple:
+    """Drive `concurrency` virtual users through `scenario` until `requests`
+    have been made or `duration` seconds have passed. Returns the (operation,
+    status, seconds) samples and the wall time; initial logins are excluded."""
+    operations = SCENARIOS[scenario]
+    users = [VirtualUser(accounts[index % len(accounts)], random.Random(seed * 100_003 + index))
+             for index in range(concurrency)]
+    await asyncio.gather(*(login(client, user) for user in users))
+
+    samples = []
+    remaining = requests
+    started_at = time.perf_counter()
+    deadline = started_at + duration if duration else None
+
+    async def worker(user: VirtualUser):
+        nonlocal remaining
+        while True:
+            if remaining is not None:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            elif time.perf_counter() >= deadline:
+                return
+            operation = pick(operations, user.rng)
+            started = time.perf_counter()
+            try:
+                status = (await operation(client, user)).status_code
+            except httpx.TransportError:
+                status = TRANSPORT_ERROR
+            samples.append((operation.__name__, status, time.perf_counter() - started))
+
+    await asyncio.gather(*(worker(user) for user in users))
+    return samples, time.perf_counter() - started_at
+
+
+async def run_asgi(app, accounts: list, **options) -> tuple:
+    """In-process driver: requests go straight into the ASGI app, so results
+    show application cost without network or server overhead."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return await run_users(client, accounts, **options)
+
+
+async def _run_http_process(url: str, accounts: list, options: dict) -> tuple:
+    limits = httpx.Limits(max_connections=options["concurrency"])
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        return await run_users(client, accounts, **options)
+
+
+def _process_main(arguments) -> tuple:
+    return asyncio.run(_run_http_process(*arguments))
+
+
+def run_http(url: str, accounts: list, processes: int, **options) -> tuple:
+    """External driver: `processes` client processes, each running
+    `concurrency` virtual users against a live server at `url`."""
+    jobs = []
+    for index in range(processes):
+        process_options = dict(options, seed=options.get("seed", 1) * 1000 + index)
+        if options.get("requests") is not None:
+            share, extra = divmod(options["requests"], processes)
+            process_options["requests"] = share + (index < extra)
+        # Spread accounts across processes so each user is driven by one process.
+        jobs.append((url, accounts[index::processes] or accounts, process_options))
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(_process_main, jobs))
+    # Processes run side by side, so the slowest one spans the whole run.
+    return ([sample for samples, _ in results for sample in samples],
+            max(wall_seconds for _, wall_seconds in results))
@@ -0,0 +1,128 @@
+"""Partial content updates: PATCH /notes/{id}/content against a full PUT /notes/edit/{id}.
+
+Runs each edit pattern on notes of several sizes through the in-process (ASGI) app,
+once sending the whole content and once sending only the ops, and reports bytes
+uploaded and latency per save.
+
+    python -m benchmarks.patches --database-url sqlite:///patches.db
+    python -m benchmarks.patches --sizes 10000,1000000 --saves 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import httpx
+from benchmarks import data
+from benchmarks.__main__ import dispose_engines, prepare
+from benchmarks.report import _percentiles
+
+
+# Each pattern returns the ops for one save and the content they produce.
+def typing_at_end(rng: random.Random, content: str) -> tuple:
+    text = " " + data._text(rng, rng.randint(10, 40))
+    return [{"op": "append", "text": text}], content + text
+
+
+def typing_in_middle(rng: random.Random, content: str) -> tuple:
+    offset, text = rng.randint(0, len(content)), data._text(rng, rng.randint(5, 30)) + " "
+    return [{"op": "insert", "offset": offset, "text": text}], content[:offset] + text + content[offset:]
+
+
+def deleting_a_sentence(rng: random.Random, content: str) -> tuple:
+    start = rng.randint(0, max(len(content) - 120, 0))
+    end = min(start + rng.randint(20, 120), len(content))
+    return [{"op": "delete", "start": start, "end": end}], content[:start] + content[end:]
+
+
+def rewording(rng: random.Random, content: str) -> tuple:
+    ops = []
+    for _ in range(3):
+        start = rng.randint(0, max(len(content) - 20, 0))
+        end, text = min(start + rng.randint(1, 20), len(content)), data._text(rng, rng.randint(1, 20))
+        ops.append({"op": "replace", "start": start, "end": end, "text": text})
+        content = content[:start] + text + content[end:]
+    return ops, content
+
+
+PATTERNS = {pattern.__name__.replace("_", "-"): pattern
+            for pattern in (typing_at_end, typing_in_middle, deleting_a_sentence, rewording)}
+
+
+async def save(client, method: str, url: str, body: dict, headers: dict, samples: list) -> tuple:
+    payload = json.dumps(body).encode()
+    started = time.perf_counter()
+    response = await client.request(method, url, content=payload,
+                                    headers={**headers, "Content-Type": "application/json"})
+    samples.append((time.perf_counter() - started) * 1000)
+    response.raise_for_status()
+    return response.headers["etag"], len(payload)
+
+
+async def run(args) -> dict:
+    import main as app_module
+
+    account = (await prepare(argparse.Namespace(database_url=args.database_url, manifest=None,
+                                                command="seed", users=1, notes=1,
+                                                seed=args.seed)))[0]
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app_module.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login = await client.post("/user/login", data={"username": account["email"],
+                                                       "password": account["password"]})
+        # Uncompressed responses keep the strong ETags that If-Match needs.
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}",
+                   "Accept-Encoding": "identity"}
+        for size in args.sizes:
+            for name, pattern in PATTERNS.items():
+                result = {"size": size, "pattern": name}
+                for method in ("PUT", "PATCH"):
+                    content = data._text(rng, size)
+                    created = await client.post("/notes/create", headers=headers, json={
+                        "title": "bench", "content": content,
+                        "category_id": account["category_ids"][0]})
+                    note_id = created.json()["id"]
+                    etag = (await client.get(f"/notes/{note_id}", headers=headers)).headers["etag"]
+                    samples, uploaded = [], 0
+                    for _ in range(args.saves):
+                        ops, content = pattern(rng, content)
+                        if method == "PUT":
+                            request = ("PUT", f"/notes/edit/{note_id}", {"content": content})
+                        else:
+                            request = ("PATCH", f"/notes/{note_id}/content", {"ops": ops})
+                        etag, sent = await save(client, *request, {**headers, "If-Match": etag},
+                                                samples)
+                        uploaded += sent
+                    final = (await client.get(f"/notes/{note_id}", headers=headers)).json()
+                    assert final["content"] == content, f"{method} {name}: content diverged"
+                    result[method.lower()] = {"bytes_per_save": round(uploaded / args.saves),
+                                              **_percentiles(samples)}
+                result["bytes_saved"] = round(1 - result["patch"]["bytes_per_save"]
+                                              / result["put"]["bytes_per_save"], 4)
+                results.append(result)
+    return {"saves": args.saves, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.patches", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to the app's configured database")
+    parser.add_argument("--sizes", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="comma-separated note sizes in characters")
+    parser.add_argument("--saves", type=int, default=30, help="saves per note and pattern")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    async def benchmark():
+        try:
+            return await run(args)
+        finally:
+            await dispose_engines()
+
+    print(json.dumps(asyncio.run(benchmark()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
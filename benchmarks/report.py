@@ -0,0 +1,51 @@
+import json
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+
+def _percentiles(latencies: list) -> dict:
+    if len(latencies) == 1:
+        value = latencies[0]
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": round(cuts[49], 3), "p95_ms": round(cuts[94], 3),
+            "p99_ms": round(cuts[98], 3)}
+
+
+def summarize(samples: list) -> dict:
+    """samples: (operation, status, seconds) tuples."""
+    latencies = [seconds * 1000 for _, _, seconds in samples]
+    return {"requests": len(samples),
+            "errors": sum(1 for _, status, _ in samples if status >= 400),
+            "mean_ms": round(statistics.fmean(latencies), 3), "max_ms": round(max(latencies), 3),
+            **_percentiles(latencies)}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(samples: list, wall_seconds: float, config: dict) -> dict:
+    operations = {}
+    for sample in samples:
+        operations.setdefault(sample[0], []).append(sample)
+    return {"timestamp": datetime.now(timezone.utc).isoformat(), "commit": _git_commit(),
+            "python": platform.python_version(), "config": config,
+            "wall_seconds": round(wall_seconds, 3),
+            "throughput_rps": round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+            "overall": summarize(samples) if samples else None,
+            "operations": {name: summarize(items) for name, items in sorted(operations.items())}}
+
+
+def write_report(report: dict, path=None):
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as output:
+            output.write(text + "\n")
+    print(text)
@@ -0,0 +1,122 @@
+"""Revision storage benchmark: delta chains against full copies.
+
+Builds an edit history for generated notes once per --max-deltas value and reports
+the characters stored, the time to record an edit and the time to rebuild a random
+revision. --max-deltas 0 makes every revision a snapshot, which is full-copy storage.
+
+    python -m benchmarks.revisions --database-url sqlite:///revisions.db
+    python -m benchmarks.revisions --notes 50 --edits 300 --max-deltas 0,8,16,32
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from sqlalchemy import delete, func, select
+import models, revisions
+from benchmarks import data
+from benchmarks.__main__ import dispose_engines, prepare
+from benchmarks.report import _percentiles
+
+Revision = models.NoteRevision
+
+
+def edit(rng: random.Random, content: str) -> str:
+    """A typical save: mostly typing at one spot or appending, sometimes a deletion."""
+    roll = rng.random()
+    position = rng.randint(0, len(content))
+    if roll < 0.5:
+        return content[:position] + " " + data._text(rng, rng.randint(5, 60)) + content[position:]
+    if roll < 0.8:
+        return content + "\n" + data._text(rng, rng.randint(20, 200))
+    return content[:position] + content[position + rng.randint(1, 80):]
+
+
+async def build_history(note_ids: list, start: dict, edits: int, max_deltas: int, seed: int) -> list:
+    import database
+
+    rng = random.Random(seed)
+    timings = []
+    async with database.SessionLocal() as db:
+        await db.execute(delete(Revision).where(Revision.note_id.in_(note_ids)))
+        for note_id in note_ids:
+            before = revisions.Version("bench", start[note_id])
+            for _ in range(edits):
+                after = revisions.Version("bench", edit(rng, before.content))
+                started = time.perf_counter()
+                await revisions.record(db, note_id, before, after, max_deltas=max_deltas)
+                timings.append((time.perf_counter() - started) * 1000)
+                before = after
+        await db.commit()
+    return timings
+
+
+async def measure(args, note_ids: list, start: dict, max_deltas: int) -> dict:
+    import database
+
+    record_ms = await build_history(note_ids, start, args.edits, max_deltas, args.seed)
+    async with database.SessionLocal() as db:
+        stored = (await db.execute(select(
+            func.count(),
+            func.coalesce(func.sum(func.length(Revision.content)), 0),
+            func.coalesce(func.sum(func.length(Revision.delta)), 0),
+            func.sum(Revision.content_length)).where(Revision.note_id.in_(note_ids)))).first()
+        latest = dict((await db.execute(select(Revision.note_id, func.max(Revision.revision))
+                                        .where(Revision.note_id.in_(note_ids))
+                                        .group_by(Revision.note_id))).all())
+
+        rng = random.Random(args.seed)
+        load_ms = []
+        for _ in range(args.reads):
+            note_id = rng.choice(note_ids)
+            started = time.perf_counter()
+            await revisions.load(db, note_id, rng.randint(1, latest[note_id]))
+            load_ms.append((time.perf_counter() - started) * 1000)
+
+    count, snapshot_chars, delta_chars, version_chars = stored
+    return {"max_deltas": max_deltas, "revisions": count,
+            "stored_chars": snapshot_chars + delta_chars, "snapshot_chars": snapshot_chars,
+            "delta_chars": delta_chars, "full_copy_chars": version_chars,
+            "stored_vs_full_copy": round((snapshot_chars + delta_chars) / version_chars, 4),
+            "record": _percentiles(record_ms), "load": _percentiles(load_ms)}
+
+
+async def run(args) -> dict:
+    import database
+
+    account = (await prepare(argparse.Namespace(database_url=args.database_url, manifest=None,
+                                                command="seed", users=1, notes=args.notes,
+                                                seed=args.seed)))[0]
+    note_ids = account["note_ids"][:args.notes]
+    async with database.SessionLocal() as db:
+        start = dict((await db.execute(select(models.Notes.id, models.Notes.content)
+                                       .where(models.Notes.id.in_(note_ids)))).all())
+    return {"notes": len(note_ids), "edits_per_note": args.edits,
+            "mean_note_chars": round(sum(map(len, start.values())) / len(start)),
+            "results": [await measure(args, note_ids, start, max_deltas)
+                        for max_deltas in args.max_deltas]}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.revisions", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to the app's configured database")
+    parser.add_argument("--notes", type=int, default=20)
+    parser.add_argument("--edits", type=int, default=200, help="edits per note")
+    parser.add_argument("--max-deltas", type=lambda value: [int(v) for v in value.split(",")],
+                        default=[0, 4, 16, 64], help="comma-separated; 0 is full-copy storage")
+    parser.add_argument("--reads", type=int, default=1000, help="random revisions to rebuild")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    async def benchmark():
+        try:
+            return await run(args)
+        finally:
+            await dispose_engines()
+
+    print(json.dumps(asyncio.run(benchmark()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import random
+
+
+class VirtualUser:
+    def __init__(self, account: dict, rng: random.Random):
+        self.account = account
+        self.rng = rng
+        self.headers = {}
+        self.next_cursor = None
+
+    def note_id(self) -> int:
+        return self.rng.choice(self.account["note_ids"])
+
+    def category_id(self) -> int:
+        return self.rng.choice(self.account["category_ids"])
+
+
+# Each operation makes one request and returns the response; the driver times it.
+async def login(client, user: VirtualUser):
+    response = await client.post("/user/login", data={"username": user.account["email"],
+                                                      "password": user.account["password"]})
+    if response.status_code == 200:
+        user.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return response
+
+
+async def list_notes(client, user: VirtualUser):
+    # Mostly the first page, sometimes the next one, as a scrolling client does.
+    params = {"limit": 50}
+    if user.next_cursor and user.rng.random() < 0.3:
+        params["cursor"] = user.next_cursor
+    response = await client.get("/notes/all", params=params, headers=user.headers)
+    if response.status_code == 200:
+        user.next_cursor = response.json()["next_cursor"]
+    return response
+
+
+async def list_bookmarks(client, user: VirtualUser):
+    return await client.get("/notes/bookmarks", headers=user.headers)
+
+
+async def list_categories(client, user: VirtualUser):
+    return await client.get("/category/all", headers=user.headers)
+
+
+async def category_notes(client, user: VirtualUser):
+    return await client.get(f"/category/{user.category_id()}", headers=user.headers)
+
+
+async def get_note(client, user: VirtualUser):
+    return await client.get(f"/notes/{user.note_id()}", headers=user.headers)
+
+
+async def search_notes(client, user: VirtualUser):
+    return await client.get("/notes/search", params={"q": user.rng.choice(["plan", "recipe",
+                                                                           "meeting notes"])},
+                            headers=user.headers)
+
+
+async def edit_note(client, user: VirtualUser):
+    return await client.put(f"/notes/edit/{user.note_id()}", headers=user.headers,
+                            json={"title": f"edited {user.rng.randrange(10 ** 6)}"})
+
+
+async def toggle_bookmark(client, user: VirtualUser):
+    return await client.put(f"/notes/bookmark/{user.note_id()}", headers=user.headers)
+
+
+async def view_me(client, user: VirtualUser):
+    return await client.get("/user/view/me", headers=user.headers)
+
+
+# Scenario name -> {operation: relative weight}.
+SCENARIOS = {
+    "login-storm": {login: 1},
+    "list-reads": {list_notes: 5, list_bookmarks: 1, list_categories: 2, category_notes: 2,
+                   get_note: 1},
+    "edit-burst": {edit_note: 6, toggle_bookmark: 2, get_note: 2},
+    "mixed": {list_notes: 30, get_note: 25, category_notes: 10, list_categories: 8,
+              search_notes: 7, edit_note: 10, toggle_bookmark: 4, view_me: 5, login: 1},
+}
+
+
+def pick(scenario: dict, rng: random.Random):
+    return rng.choices(list(scenario), weights=list(scenario.values()))[0]
@@ -0,0 +1,60 @@
+"""Micro-benchmark: FastAPI's response_model path vs serialization.page_response.
+
+    python -m benchmarks.serialization --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import timeit
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from anyio import run
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+import schemas, serialization
+
+# Same shape as the rows the list endpoints select: AllNoteOut fields + sort key.
+NoteRow = namedtuple("NoteRow", ["id", "title", "date_modified"])
+
+
+def make_page(rows: int) -> dict:
+    now = datetime.now(timezone.utc)
+    items = [NoteRow(i, f"Note title number {i}", now - timedelta(seconds=i)) 
+             for i in range(rows, 0, -1)]
+    return {"items": items, "next_cursor": None}
+
+
+def fastapi_path(page: dict, field, response_class) -> bytes:
+    content = run(lambda: serialize_response(field=field, response_content=page))
+    return response_class(content).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    page = make_page(args.rows)
+    field = create_model_field(name="Response_get_all_notes", 
+                               type_=schemas.Page[schemas.AllNoteOut], mode="serialization")
+    paths = {
+        "fastapi+json": lambda: fastapi_path(page, field, JSONResponse),
+        "fastapi+orjson": lambda: fastapi_path(page, field, ORJSONResponse),
+        "typeadapter": lambda: serialization.dump_json(schemas.Page[schemas.AllNoteOut], page),
+        "page_response": lambda: serialization.page_response(schemas.AllNoteOut, page).body,
+    }
+
+    bodies = {name: json.loads(path()) for name, path in paths.items()}
+    assert all(body == bodies["fastapi+json"] for body in bodies.values()), "paths disagree"
+
+    results = {}
+    for name, path in paths.items():
+        best = min(timeit.repeat(path, number=1, repeat=args.repeat))
+        results[name] = {"best_ms": round(best * 1000, 3), 
+                         "rows_per_s": round(args.rows / best)}
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from typing import Optional
+from config import settings
+import metrics
+import schemas
+
+
+class PrincipalCache(ABC):
+    """Interface used by oauth2 to cache authenticated principals by user id.
+
+    The methods are coroutines so a backend shared between workers (Redis,
+    memcached, ...) can be dropped in with set_principal_cache()."""
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[schemas.Principal]:
+        ...
+
+    @abstractmethod
+    async def set(self, user_id: int, principal: schemas.Principal) -> None:
+        ...
+
+    @abstractmethod
+    async def invalidate(self, user_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class LocalPrincipalCache(PrincipalCache):
+    """Per-process LRU cache whose entries expire after `ttl` seconds.
+
+    Only touched from the event loop and never awaits while mutating, so no
+    lock is needed."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, user_id: int) -> Optional[schemas.Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        principal, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return principal
+
+    async def set(self, user_id: int, principal: schemas.Principal) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[user_id] = (principal, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, 
+                "misses": self.misses, "evictions": self.evictions}
+
+
+principal_cache: PrincipalCache = LocalPrincipalCache(settings.principal_cache_size, 
+                                                      settings.principal_cache_ttl)
+
+metrics.Gauge("principal_cache", "Principal cache statistics (size, hits, misses, ...).", ["stat"], 
+              collect=lambda: {(key,): value for key, value in principal_cache.stats().items()})
+
+def set_principal_cache(cache: PrincipalCache):
+    global principal_cache
+    principal_cache = cache
@@ -0,0 +1,238 @@
+"""Live change events for /notes/stream.
+
+Handlers stage events on their session with `publish`; nothing goes out unless the
+transaction commits. On PostgreSQL the events travel as NOTIFY payloads sent inside
+that transaction, so every worker hears them; each worker holds a single LISTEN
+connection and fans what it hears out to its own subscribers. Elsewhere (SQLite,
+tests) they are handed to this process's subscribers once the commit succeeds."""
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncpg
+import orjson
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from starlette.websockets import WebSocket
+from config import settings
+import database, metrics
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "note_changes"
+MEDIA_TYPE = "text/event-stream"
+# NOTIFY payloads are capped at 8000 bytes; an event is well under 80.
+EVENTS_PER_NOTIFY = 80
+READY = {"type": "ready"}
+RESYNC = {"type": "resync"}
+
+RESYNCS = metrics.Counter("changefeed_resyncs_total",
+                          "Event queues dropped for a resync: slow consumers and lost LISTENs.")
+LISTENING = metrics.Gauge("changefeed_listening", "1 while the worker's LISTEN connection is up.")
+
+
+class Subscription:
+    """One connection's bounded event queue. A consumer that falls `maxsize`
+    events behind loses the backlog for a single resync event, telling it to
+    catch up through /sync/changes, so a stalled client holds at most `maxsize`
+    events in memory and never slows down the others."""
+
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, change: dict):
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            RESYNCS.inc()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Delivers committed events to the subscribers in this process."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers = defaultdict(set)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int):
+        subscription = Subscription(self.queue_size)
+        self.subscribers[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            self.subscribers[user_id].discard(subscription)
+            if not self.subscribers[user_id]:
+                del self.subscribers[user_id]
+
+    def deliver(self, user_id: int, changes: list):
+        for subscription in self.subscribers.get(user_id, ()):
+            for change in changes:
+                subscription.put(change)
+
+    def resync_all(self):
+        for subscriptions in self.subscribers.values():
+            for subscription in subscriptions:
+                subscription.put(RESYNC)
+
+    def before_commit(self, session: Session, user_id: int, changes: list):
+        pass
+
+    def after_commit(self, user_id: int, changes: list):
+        self.deliver(user_id, changes)
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class PostgresBroker(LocalBroker):
+    """Sends events with NOTIFY in the committing transaction and receives them,
+    from this worker and every other, on one LISTEN connection per worker."""
+
+    def __init__(self, queue_size: int, dsn: str, ping_interval: float):
+        super().__init__(queue_size)
+        self.dsn = dsn
+        self.ping_interval = ping_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def before_commit(self, session: Session, user_id: int, changes: list):
+        for start in range(0, len(changes), EVENTS_PER_NOTIFY):
+            payload = orjson.dumps({"user_id": user_id,
+                                    "events": changes[start:start + EVENTS_PER_NOTIFY]})
+            session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                            {"channel": CHANNEL, "payload": payload.decode()})
+
+    def after_commit(self, user_id: int, changes: list):
+        pass  # comes back through LISTEN like everyone else's
+
+    def _notified(self, connection, pid, channel, payload):
+        message = orjson.loads(payload)
+        self.deliver(message["user_id"], message["events"])
+
+    async def _listen(self):
+        delay = 1
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, self._notified)
+                LISTENING.set(value=1)
+                # Whatever was committed while nobody listened is gone.
+                self.resync_all()
+                delay = 1
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.ping_interval)
+                    except TimeoutError:
+                        # A dead peer only shows up when something is sent.
+                        await asyncio.wait_for(connection.execute("SELECT 1"), self.ping_interval)
+            except (OSError, TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                logger.warning("Change feed LISTEN connection lost: %r", exc)
+            except Exception:
+                # Anything else would end the task and leave subscribers waiting forever.
+                logger.exception("Change feed listener failed")
+            finally:
+                LISTENING.set(value=0)
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen(), name="changefeed-listen")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def publish(db, user_id: int, change_type: str, *ids: int):
+    """Stage `change_type` events (note.created, category.deleted, ...) for each
+    of `ids`, or one bare event without ids. They are sent when `db` commits and
+    dropped if it rolls back."""
+    changes = [{"type": change_type, "id": id} for id in ids] if ids else [{"type": change_type}]
+    db.info.setdefault("changefeed", {}).setdefault(user_id, []).extend(changes)
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session: Session):
+    for user_id, changes in session.info.get("changefeed", {}).items():
+        broker.before_commit(session, user_id, changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session):
+    for user_id, changes in session.info.pop("changefeed", {}).items():
+        broker.after_commit(user_id, changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session):
+    session.info.pop("changefeed", None)
+
+
+def _sse(change: dict) -> bytes:
+    return b"event: %s\ndata: %s\n\n" % (change["type"].encode(), orjson.dumps(change))
+
+
+async def sse_events(user_id: int):
+    async with broker.subscribe(user_id) as subscription:
+        yield _sse(READY)
+        while True:
+            change = await subscription.get(settings.changefeed_heartbeat)
+            # A comment line keeps proxies from closing an idle stream and
+            # notices a client that has gone.
+            yield _sse(change) if change else b": ping\n\n"
+
+
+async def websocket_events(websocket: WebSocket, user_id: int):
+    async with broker.subscribe(user_id) as subscription:
+
+        async def forward():
+            await websocket.send_text(orjson.dumps(READY).decode())
+            while True:
+                await websocket.send_text(orjson.dumps(await subscription.get()).decode())
+
+        sender = asyncio.create_task(forward())
+        try:
+            # Clients only listen; reading is how their close is noticed.
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+
+
+def create_broker(engine) -> LocalBroker:
+    if engine.dialect.name != "postgresql":
+        return LocalBroker(settings.changefeed_queue_size)
+    url = engine.url.set(drivername=database.SYNC_DRIVERS["postgresql"])
+    return PostgresBroker(settings.changefeed_queue_size, url.render_as_string(hide_password=False),
+                          settings.changefeed_heartbeat)
+
+
+broker = create_broker(database.write_engine)
+
+metrics.Gauge("changefeed_subscribers", "Open /notes/stream connections in this worker.",
+              collect=lambda: {(): sum(map(len, broker.subscribers.values()))})
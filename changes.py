@@ -0,0 +1,90 @@
+from fastapi import HTTPException, status
+from sqlalchemy import and_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+import models, schemas
+from pagination import decode_cursor, encode_cursor
+from projection import columns_for
+
+# Changes are ordered by (change_seq, kind rank, id). A token is the position of
+# the last change served; COMPLETE as its rank means "everything up to and
+# including this change_seq", which is what a finished sync hands back.
+CATEGORY_RANK, NOTE_RANK, TOMBSTONE_RANK, COMPLETE = 0, 1, 2, 3
+INITIAL_POSITION = (-1, COMPLETE, 0)
+
+
+def decode_token(token):
+    if not token:
+        return INITIAL_POSITION
+    try:
+        return tuple(decode_cursor(token, [models.Notes.change_seq, models.Notes.id, 
+                                           models.Notes.id]))
+    except HTTPException:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+
+
+def encode_token(position):
+    return encode_cursor(list(position))
+
+
+def _after(table, rank, position, upper_seq):
+    seq, last_rank, last_id = position
+    if last_rank < rank:
+        after = table.change_seq >= seq
+    elif last_rank == rank:
+        after = tuple_(table.change_seq, table.id) > tuple_(seq, last_id)
+    else:
+        after = table.change_seq > seq
+    return and_(after, table.change_seq <= upper_seq)
+
+
+async def get_changes(db: AsyncSession, user_id: int, token, limit: int):
+    """Return the notes, categories and deletions after `token`, oldest first.
+
+    The user's current change_seq is read first and bounds every query, so a
+    client that is up to date costs a single primary-key lookup."""
+    position = decode_token(token)
+    upper_seq = await db.scalar(select(models.Users.change_seq).filter_by(id=user_id))
+    if upper_seq is None:
+        # Deleted since its principal was cached.
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
+                            detail="Could not validate credentials", 
+                            headers={"WWW-Authenticate": "Bearer"})
+    if position[0] >= upper_seq and position[1] == COMPLETE:
+        return {"notes": [], "categories": [], "deleted": [], "next_token": encode_token(position), 
+                "has_more": False}
+
+    sources = [
+        (CATEGORY_RANK, select(models.NoteCategory.id, models.NoteCategory.change_seq, 
+                               models.NoteCategory.category_name)
+         .where(models.NoteCategory.user_id == user_id, 
+                _after(models.NoteCategory, CATEGORY_RANK, position, upper_seq))
+         .order_by(models.NoteCategory.change_seq, models.NoteCategory.id)),
+        (NOTE_RANK, select(*columns_for(models.Notes, schemas.NoteChange, models.Notes.change_seq))
+         .where(models.Notes.user_id == user_id, 
+                _after(models.Notes, NOTE_RANK, position, upper_seq))
+         .order_by(models.Notes.change_seq, models.Notes.id)),
+        (TOMBSTONE_RANK, select(models.SyncTombstone.id, models.SyncTombstone.change_seq, 
+                                models.SyncTombstone.kind, models.SyncTombstone.entity_id)
+         .where(models.SyncTombstone.user_id == user_id, 
+                _after(models.SyncTombstone, TOMBSTONE_RANK, position, upper_seq))
+         .order_by(models.SyncTombstone.change_seq, models.SyncTombstone.id)),
+    ]
+    merged = []
+    for rank, statement in sources:
+        rows = (await db.execute(statement.limit(limit + 1))).all()
+        merged.extend((row.change_seq, rank, row.id, row) for row in rows)
+    merged.sort(key=lambda change: change[:3])
+
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    changes = {"notes": [], "categories": [], "deleted": []}
+    for _, rank, _, row in merged:
+        if rank == NOTE_RANK:
+            changes["notes"].append(row)
+        elif rank == CATEGORY_RANK:
+            changes["categories"].append(row)
+        else:
+            changes["deleted"].append({"kind": row.kind, "id": row.entity_id})
+
+    next_position = merged[-1][:3] if has_more else (upper_seq, COMPLETE, 0)
+    return {**changes, "next_token": encode_token(next_position), "has_more": has_more}
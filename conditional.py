@@ -0,0 +1,101 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import database, models, oauth2
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def note_etag(note_id: int, change_seq: int) -> str:
+    return f'"n{note_id}.{change_seq}"'
+
+
+def collection_etag(request: Request, user_id: int, version: int) -> str:
+    # The page a list endpoint returns depends on its query string as well as the data.
+    query = hashlib.blake2s(f"{request.url.path}?{request.url.query}".encode(), 
+                            digest_size=8).hexdigest()
+    return f'"u{user_id}.{version}.{query}"'
+
+
+def _entity_tags(header: str):
+    return [tag.strip() for tag in header.split(",")]
+
+
+def _http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_fresh(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """True when the client's cached copy is current (RFC 9110 section 13.2.2:
+    If-None-Match wins over If-Modified-Since)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: a W/ tag, as sent back after a compressed response, matches.
+        tags = [tag.removeprefix("W/") for tag in _entity_tags(if_none_match)]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validators(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None):
+    return HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, 
+                         headers=validators(etag, last_modified))
+
+
+def expected_change_seq(if_match: Optional[str], note_id: int) -> Optional[int]:
+    """The change_seq an If-Match header pins the note to, or None for no
+    header / `*`. A tag for another note can never match, so that is a 412.
+
+    If-Match uses strong comparison (RFC 9110 section 13.1.1), so a weak tag is
+    a 412 too. Compressed responses carry weak ETags; a client that edits should
+    read the note with Accept-Encoding: identity."""
+    if if_match is None:
+        return None
+    tags = _entity_tags(if_match)
+    if "*" in tags:
+        return None
+    prefix = f'"n{note_id}.'
+    for tag in tags:
+        if tag.startswith(prefix) and tag.endswith('"') and tag[len(prefix):-1].isdigit():
+            return int(tag[len(prefix):-1])
+    raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, 
+                        detail="Note has been modified")
+
+
+async def check_collection(request: Request, response: Response, 
+                           db: AsyncSession = Depends(database.get_db), 
+                           current_user = Depends(oauth2.get_current_user)):
+    """Route dependency for list endpoints. Any note or category change bumps the
+    user's change_seq, so it versions every list; comparing it against
+    If-None-Match answers 304 with one primary-key lookup and no row loading."""
+    version = await db.scalar(select(models.Users.change_seq).filter_by(id=current_user.id))
+    etag = collection_etag(request, current_user.id, version)
+    if is_fresh(request, etag):
+        raise not_modified(etag)
+    response.headers.update(validators(etag))
@@ -1,18 +1,68 @@
+from typing import Optional
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
-    database_username: str
-    database_password: str
-    database_hostname: str
-    database_port: str
-    database_name: str
+    # Either a full URL (postgresql://..., sqlite:///notes.db) or the five PostgreSQL parts.
+    database_url: Optional[str] = None
+    database_username: Optional[str] = None
+    database_password: Optional[str] = None
+    database_hostname: Optional[str] = None
+    database_port: Optional[str] = None
+    database_name: Optional[str] = None
+    # Comma-separated read replica URLs; GET requests read from them when healthy.
+    database_replica_urls: Optional[str] = None
+    read_your_writes_seconds: float = 5
     algorithm: str
     secret: str
     access_time: int
     refresh_time: int
+    db_pool_size: int = 20
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_command_timeout: float = 60
+    principal_cache_size: int = 10000
+    principal_cache_ttl: float = 60
+    bcrypt_rounds: int = 12
+    hashing_workers: int = 2
+    hashing_max_queue: int = 64
+    compression_minimum_size: int = 1024
+    compression_offload_size: int = 65536
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+    sql_debug: bool = False
+    sql_debug_repeat_threshold: int = 5
+    health_check_interval: float = 5
+    health_check_timeout: float = 2
+    sqlite_read_connections: int = 8
+    sqlite_busy_timeout: int = 5000
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size: int = 16384
+    sqlite_mmap_size: int = 268435456
+    changefeed_queue_size: int = 100
+    changefeed_heartbeat: float = 15
+    revision_max_deltas: int = 16
+    revision_max_count: int = 100
+    revision_retention_days: float = 90
+    revision_compaction_interval: float = 3600
+    attachment_path: str = "attachments"
+    attachment_max_size: int = 26214400
+    import_max_size: int = 104857600
+    import_max_line: int = 1048576
     
     
     class Config:
         env_file=".env"
+
+    @model_validator(mode="after")
+    def check_database(self):
+        parts = (self.database_username, self.database_password, self.database_hostname,
+                 self.database_port, self.database_name)
+        if not self.database_url and None in parts:
+            raise ValueError("set DATABASE_URL, or DATABASE_USERNAME, DATABASE_PASSWORD, "
+                             "DATABASE_HOSTNAME, DATABASE_PORT and DATABASE_NAME")
+        return self
         
 settings=Settings()
\ No newline at end of file
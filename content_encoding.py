@@ -0,0 +1,186 @@
+import zlib
+from functools import lru_cache
+from typing import Optional
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional: br is only offered when the package is installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, likewise for zstd
+    zstandard = None
+
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "application/xml",
+                      "application/javascript"}
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return (self._compressor.compress(data)
+                + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+# Server preference, used to break ties between equally weighted codings.
+ENCODERS = {name: encoder for name, encoder, module in [("br", BrotliEncoder, brotli),
+                                                         ("zstd", ZstdEncoder, zstandard),
+                                                         ("gzip", GzipEncoder, zlib)] if module}
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick a content coding from an Accept-Encoding header (RFC 9110 section
+    12.5.3): highest q-value wins, `*` covers unlisted codings, q=0 refuses."""
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+
+    best, best_weight = None, 0.0
+    for coding in ENCODERS:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    if not 200 <= status < 300 or status in (204, 206) or "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type == "text/event-stream":
+        # Long-lived: a compressor per open stream costs more than the few bytes it saves.
+        return False
+    return (media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+            or media_type.endswith(("+json", "+xml")))
+
+
+class CompressionMiddleware:
+    """Compress responses with the best coding the client accepts.
+
+    Single-message bodies under `minimum_size` go out untouched. Streamed
+    bodies are compressed chunk by chunk and flushed after each, so clients
+    still see data as it is produced. Chunks of `offload_size` bytes or more
+    are compressed in a worker thread to keep the event loop free."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, offload_size: int = 64 * 1024,
+                 levels: Optional[dict] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.levels = {"gzip": 6, "br": 4, "zstd": 3, **(levels or {})}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            return await self.app(scope, receive, send)
+        await CompressionResponder(self, coding, send)(scope, receive, self.app)
+
+
+class CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, coding: str, send: Send):
+        self.middleware = middleware
+        self.coding = coding
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, app: ASGIApp):
+        await app(scope, receive, self.send_compressed)
+
+    async def _run(self, function, data: bytes) -> bytes:
+        if len(data) >= self.middleware.offload_size:
+            return await anyio.to_thread.run_sync(function, data)
+        return function(data)
+
+    def _encoded_headers(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.coding
+        headers.add_vary_header("Accept-Encoding")
+        # The compressed bytes are a different representation of the same
+        # resource, so a strong validator becomes weak (as nginx does).
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows how big the body is.
+            self.start_message = message
+            return
+        if message["type"] == "http.response.pathsend" and self.start_message is not None:
+            # The server sends the file itself; there is no body to compress.
+            self.passthrough = True
+            start_message, self.start_message = self.start_message, None
+            await self.send(start_message)
+        if message["type"] != "http.response.body" or self.passthrough:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start_message["headers"])
+            if (not is_compressible(start_message["status"], headers)
+                    or (not more_body and len(body) < self.middleware.minimum_size)):
+                self.passthrough = True
+                await self.send(start_message)
+                return await self.send(message)
+
+            self.encoder = ENCODERS[self.coding](self.middleware.levels[self.coding])
+            self._encoded_headers(headers)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = await self._run(self.encoder.finish, body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start_message)
+                return await self.send({"type": "http.response.body", "body": body})
+            await self.send(start_message)
+
+        encode = self.encoder.compress if more_body else self.encoder.finish
+        await self.send({"type": "http.response.body", "body": await self._run(encode, body),
+                         "more_body": more_body})
@@ -0,0 +1,18 @@
+from fastapi import HTTPException, status
+
+
+def apply_ops(content: str, ops: list) -> str:
+    """Apply PATCH /notes/{id}/content ops in order, each to the result of the
+    ones before it. Offsets count characters (code points) and ranges are
+    [start, end), like Python slices."""
+    for index, op in enumerate(ops):
+        if op.op == "append":
+            content += op.text
+            continue
+        start, end = (op.offset, op.offset) if op.op == "insert" else (op.start, op.end)
+        if not start <= end <= len(content):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, 
+                                detail=f"Op {index}: range {start}-{end} is outside the content "
+                                       f"(length {len(content)})")
+        content = content[:start] + getattr(op, "text", "") + content[end:]
+    return content
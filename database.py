@@ -1,24 +1,217 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.orm import declarative_base
+import itertools
+import time
+from collections import OrderedDict
+from fastapi import Request
+from sqlalchemy import TextClause, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import StaticPool
 from config import settings
 
 Base = declarative_base()
 
-SQLALCHEMY_DATABASE_URL = (f"postgresql://{settings.database_username}:"
-                           f"{settings.database_password}@"
-                            f"{settings.database_hostname}:"
-                            f"{settings.database_port}/"
-                            f"{settings.database_name}")
+# Driver per backend: the app runs on the asyncio drivers, Alembic on the blocking ones.
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+SYNC_DRIVERS = {"postgresql": "postgresql", "sqlite": "sqlite"}
+READ_METHODS = {"GET", "HEAD"}
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False)
+def database_url(drivers: dict = ASYNC_DRIVERS, url: str = None) -> URL:
+    """`url`, DATABASE_URL or the URL assembled from the database_* settings,
+    with its driver swapped for the one `drivers` names for its backend."""
+    url = make_url(url or settings.database_url or
+                   f"postgresql://{settings.database_username}:"
+                   f"{settings.database_password}@"
+                   f"{settings.database_hostname}:"
+                   f"{settings.database_port}/"
+                   f"{settings.database_name}")
+    backend = url.get_backend_name()
+    backend = "postgresql" if backend == "postgres" else backend
+    return url.set(drivername=drivers.get(backend, url.drivername))
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+def _is_memory(url: URL) -> bool:
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def _sqlite_pragmas(engine, memory: bool, begin: str, read_only: bool = False):
+    pragmas = [f"busy_timeout = {settings.sqlite_busy_timeout}", "foreign_keys = ON",
+               f"synchronous = {settings.sqlite_synchronous}",
+               f"cache_size = -{settings.sqlite_cache_size}",
+               f"mmap_size = {settings.sqlite_mmap_size}", "temp_store = MEMORY"]
+    if not memory:
+        pragmas.insert(1, "journal_mode = WAL")
+    if read_only:
+        pragmas.append("query_only = ON")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        # Take transaction control away from the sqlite3 module so `begin` below decides
+        # how each transaction starts (and PRAGMA journal_mode runs outside one).
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def do_begin(connection):
+        connection.exec_driver_sql(begin)
+
+
+def _postgres_engine(url: URL):
+    return create_async_engine(url,
+                               pool_size=settings.db_pool_size,
+                               max_overflow=settings.db_max_overflow,
+                               pool_timeout=settings.db_pool_timeout,
+                               pool_recycle=settings.db_pool_recycle,
+                               pool_pre_ping=True,
+                               connect_args={"command_timeout": settings.db_command_timeout})
+
+
+def create_read_engine(url: URL):
+    """An engine for reads only: the SQLite reader pool, or a PostgreSQL pool."""
+    if url.get_backend_name() != "sqlite":
+        return _postgres_engine(url)
+    engine = create_async_engine(url, pool_size=settings.sqlite_read_connections, max_overflow=0,
+                                 pool_timeout=settings.db_pool_timeout)
+    _sqlite_pragmas(engine, memory=False, begin="BEGIN", read_only=True)
+    return engine
+
+
+def create_engines(url: URL) -> tuple:
+    """Returns (engine, write_engine). On PostgreSQL both are the one pooled engine.
+
+    On a SQLite file, WAL lets any number of readers run alongside one writer, so
+    reads get a pool of query_only connections and writes a single connection that
+    starts with BEGIN IMMEDIATE: writers queue for that connection in the pool rather
+    than failing with SQLITE_BUSY when a read transaction tries to upgrade to a write.
+    An in-memory database exists per connection, so it gets exactly one for both."""
+    if url.get_backend_name() != "sqlite":
+        engine = _postgres_engine(url)
+        return engine, engine
+
+    if _is_memory(url):
+        engine = create_async_engine(url, poolclass=StaticPool)
+        _sqlite_pragmas(engine, memory=True, begin="BEGIN")
+        return engine, engine
+
+    write_engine = create_async_engine(url, pool_size=1, max_overflow=0,
+                                       pool_timeout=settings.db_pool_timeout)
+    _sqlite_pragmas(write_engine, memory=False, begin="BEGIN IMMEDIATE")
+    return create_read_engine(url), write_engine
+
+
+class Replica:
+    """A read replica. It takes reads only while its health check (set up in
+    health.py) passes, so a replica that goes away fails over to the primary."""
+
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.health = None
+
+    @property
+    def available(self) -> bool:
+        return self.health is not None and self.health.ready
+
+
+class RecentWriters:
+    """Users who committed a write in the last `window` seconds. Their reads stay
+    on the primary until the replicas have had time to replay the write. Kept per
+    process; entries expire in insertion order, so pruning is from the front."""
+
+    def __init__(self, window: float):
+        self.window = window
+        self._until: OrderedDict = OrderedDict()
+
+    def mark(self, user_id: int):
+        now = time.monotonic()
+        self._until[user_id] = now + self.window
+        self._until.move_to_end(user_id)
+        while self._until and next(iter(self._until.values())) <= now:
+            self._until.popitem(last=False)
+
+    def __contains__(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        return until is not None and until > time.monotonic()
+
+
+def pick_replica():
+    """Round-robin over the replicas whose health check passes; None means the
+    primary."""
+    available = [replica for replica in replicas if replica.available]
+    return available[next(_replica_turn) % len(available)] if available else None
+
+
+class RoutingSession(Session):
+    """Sends writes to info["write_engine"] and reads to the session's bind or,
+    for a session opened with info["replica_reads"], to a replica.
+
+    A locking read (SELECT ... FOR UPDATE) counts as a write: it is the first
+    step of one. Once a transaction has written it stays on the writer, so it
+    reads its own changes; after it ends, reads go back to the readers, which see the committed
+    data. A session picks its replica once, at its first read, and skips the
+    replicas for users in `recent_writers` (see oauth2, which records the user)."""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        write_engine = self.info.get("write_engine")
+        if write_engine is not None and (self.info.get("wrote") or self._flushing
+                                         or getattr(clause, "is_dml", False)
+                                         or getattr(clause, "_for_update_arg", None) is not None
+                                         or isinstance(clause, TextClause)):
+            self.info["wrote"] = True
+            return write_engine.sync_engine
+        if self.info.get("replica_reads"):
+            if "replica" not in self.info:
+                self.info["replica"] = (None if self.info.get("user_id") in recent_writers
+                                        else pick_replica())
+            if self.info["replica"] is not None:
+                return self.info["replica"].engine.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+    def commit(self):
+        try:
+            super().commit()
+            if self.info.get("wrote") and self.info.get("user_id") is not None:
+                recent_writers.mark(self.info["user_id"])
+        finally:
+            self.info.pop("wrote", None)
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self.info.pop("wrote", None)
+
+
+def create_sessionmaker(engine, write_engine) -> async_sessionmaker:
+    # expire_on_commit=False: an expired attribute would need a lazy load on access,
+    # which an AsyncSession cannot do implicitly.
+    if write_engine is engine and not replicas:
+        return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    return async_sessionmaker(bind=engine, sync_session_class=RoutingSession,
+                              info={"write_engine": write_engine},
+                              autoflush=False, expire_on_commit=False)
+
+
+engine, write_engine = create_engines(database_url())
+replicas = [Replica(f"replica{index}", create_read_engine(database_url(url=url.strip())))
+            for index, url in enumerate((settings.database_replica_urls or "").split(","))
+            if url.strip()]
+_replica_turn = itertools.count()
+recent_writers = RecentWriters(settings.read_your_writes_seconds)
+SessionLocal = create_sessionmaker(engine, write_engine)
+
+async def dispose_engines():
+    """Close every pooled connection. aiosqlite runs each connection on a thread
+    that is not a daemon, so a process that skips this never exits."""
+    for each in {engine, write_engine, *(replica.engine for replica in replicas)}:
+        await each.dispose()
+
+async def get_db(request: Request):
+    # Only GET and HEAD handlers may read from a replica; anything else is about
+    # to write and must read what it modifies from the primary.
+    async with SessionLocal(info={"replica_reads": request.method in READ_METHODS}) as db:
         yield db
-    finally:
-        db.close()
-    
\ No newline at end of file
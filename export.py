@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+import database, models
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_FIELDS = ["id", "title", "content", "category_id", "category_name", "bookmark", 
+                 "date_created", "date_modified"]
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _export_statement(user_id: int):
+    return (select(models.Notes.id, models.Notes.title, models.Notes.content, 
+                   models.Notes.category_id, models.NoteCategory.category_name, 
+                   models.Notes.bookmark, models.Notes.date_created, models.Notes.date_modified)
+            .outerjoin(models.NoteCategory, models.Notes.category_id == models.NoteCategory.id)
+            .where(models.Notes.user_id == user_id)
+            .order_by(models.Notes.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+
+def _values(row):
+    return [value.isoformat() if isinstance(value, datetime) else value for value in row]
+
+
+def _ndjson_chunk(rows):
+    return "".join(json.dumps(dict(zip(EXPORT_FIELDS, _values(row))), ensure_ascii=False) + "\n" 
+                   for row in rows)
+
+
+def _csv_chunk(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows(_values(row) for row in rows)
+    return buffer.getvalue()
+
+
+async def _export_text(user_id: int, format: str):
+    # The request's session is closed before a StreamingResponse body runs, so the
+    # export holds its own session and server-side cursor for the whole stream.
+    async with database.SessionLocal(info={"replica_reads": True, "user_id": user_id}) as db:
+        result = await db.stream(_export_statement(user_id))
+        if format == "csv":
+            yield _csv_chunk([], header=True)
+        async for rows in result.partitions():
+            yield _ndjson_chunk(rows) if format == "ndjson" else _csv_chunk(rows)
+
+
+async def export_notes(user_id: int, format: str, compress: bool = False):
+    """Yield the user's notes as encoded chunks, one batch of rows at a time, so
+    memory stays flat however large the notebook is."""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+    async for text in _export_text(user_id, format):
+        data = text.encode()
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import Optional
+from sqlalchemy import text
+from config import settings
+import database, metrics
+
+
+class DatabaseHealth:
+    """Probes the database from a background task so the health endpoints answer
+    from memory and their latency does not depend on the database's. Each probe
+    checks a connection out of the engine's pool once per interval, like any
+    request; health endpoints themselves never do."""
+
+    def __init__(self, engine, interval: float, timeout: float, name: str = "database"):
+        self.engine = engine
+        self.name = name
+        self.interval = interval
+        self.timeout = timeout
+        self.status = "starting"
+        self.detail: Optional[str] = None
+        self.latency_ms: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self._checked_monotonic: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self):
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout):
+                async with self.engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+            self.status, self.detail = "ok", None
+        except Exception as exc:
+            self.status, self.detail = "error", f"{type(exc).__name__}: {exc}"
+        self.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.checked_at = time.time()
+        self._checked_monotonic = time.monotonic()
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"{self.name}-health")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def ready(self) -> bool:
+        # A result older than a few intervals means the checker itself is stuck.
+        return (self.status == "ok" and self._checked_monotonic is not None
+                and time.monotonic() - self._checked_monotonic < 3 * self.interval + self.timeout)
+
+    def snapshot(self) -> dict:
+        pool = self.engine.sync_engine.pool
+        pool_stats = {name: getattr(pool, name)() for name in ("size", "checkedout", "overflow")
+                      if hasattr(pool, name)}
+        return {"status": self.status, "detail": self.detail, "latency_ms": self.latency_ms,
+                "checked_at": self.checked_at, "pool": pool_stats}
+
+
+database_health = DatabaseHealth(database.engine, settings.health_check_interval,
+                                 settings.health_check_timeout)
+# On SQLite writes go through their own single-connection engine; probe it too.
+writer_health = (DatabaseHealth(database.write_engine, settings.health_check_interval,
+                                settings.health_check_timeout, name="writer")
+                 if database.write_engine is not database.engine else None)
+for replica in database.replicas:
+    replica.health = DatabaseHealth(replica.engine, settings.health_check_interval,
+                                    settings.health_check_timeout, name=replica.name)
+
+
+def primary_checks() -> list:
+    return [database_health] + ([writer_health] if writer_health is not None else [])
+
+
+def health_checks() -> list:
+    return primary_checks() + [replica.health for replica in database.replicas]
+
+
+metrics.Gauge("db_replica_available", "1 while a read replica is taking reads.", ["replica"],
+              collect=lambda: {(replica.name,): int(replica.available) 
+                               for replica in database.replicas})
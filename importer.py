@@ -0,0 +1,241 @@
+import csv
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import anyio
+from fastapi import HTTPException, status
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+import models, changefeed
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+COPY_COLUMNS = ["user_id", "title", "content", "category_id", "bookmark", "date_created", 
+                "date_modified", "change_seq"]
+TRUE_VALUES = {"true", "1", "yes", "y", "t"}
+FALSE_VALUES = {"false", "0", "no", "n", "f", ""}
+DIALECT_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+# Uploads up to this size stay in memory while spooled; larger ones go to disk.
+SPOOL_MEMORY_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+class RowError(ValueError):
+    pass
+
+
+def _too_large(limit: str):
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=limit)
+
+
+@asynccontextmanager
+async def spool(stream):
+    """Receive the whole upload into a temporary file before any of it is
+    imported, so a slow client never holds a transaction open."""
+    async with anyio.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE) as file:
+        size = 0
+        async for chunk in stream:
+            size += len(chunk)
+            if size > settings.import_max_size:
+                raise _too_large(f"Imports are limited to {settings.import_max_size} bytes")
+            await file.write(chunk)
+        await file.seek(0)
+        yield file
+
+
+async def _chunks(file):
+    while chunk := await file.read(READ_SIZE):
+        yield chunk
+
+
+async def _lines(stream):
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        if len(pending) > settings.import_max_line:
+            raise _too_large(f"Import lines are limited to {settings.import_max_line} bytes")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def _ndjson_records(stream):
+    line_number = 0
+    async for line in _lines(stream):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, RowError("Invalid JSON")
+            continue
+        yield line_number, record if isinstance(record, dict) else RowError("Expected a JSON object")
+
+
+async def _csv_records(stream):
+    # A physical line ends a CSV record once the record holds an even number of
+    # quote characters (escaped quotes are doubled), so quoted newlines survive.
+    header, record, quotes, line_number, start = None, [], 0, 0, 1
+    async for line in _lines(stream):
+        line_number += 1
+        text = line.decode("utf-8-sig" if line_number == 1 else "utf-8", errors="replace")
+        record.append(text.rstrip("\r"))
+        quotes += text.count('"')
+        if quotes % 2:
+            continue
+        fields = next(csv.reader(["\n".join(record)]), [])
+        record, quotes = [], 0
+        if header is None:
+            header = [field.strip() for field in fields]
+        elif any(fields):
+            yield start, dict(zip(header, fields))
+        start = line_number + 1
+    if record:
+        yield start, RowError("Unterminated quoted field")
+
+
+def _parse_bool(value):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f"Invalid bookmark value: {value!r}")
+
+
+def _parse_datetime(value, default):
+    if value in (None, ""):
+        return default
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise RowError(f"Invalid datetime: {value!r}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _parse_note(record: dict, imported_at: datetime):
+    title, content = record.get("title"), record.get("content")
+    if not isinstance(title, str) or not title.strip():
+        raise RowError("title is required")
+    if not isinstance(content, str):
+        raise RowError("content is required")
+    category_name = (record.get("category_name") or "").strip().title() or "Uncategorized"
+    date_created = _parse_datetime(record.get("date_created"), imported_at)
+    return (title, content, category_name, _parse_bool(record.get("bookmark")), 
+            date_created, _parse_datetime(record.get("date_modified"), date_created))
+
+
+class NoteImporter:
+    """Loads notes in chunks: each chunk creates its unseen categories with one
+    INSERT ... RETURNING, then writes its notes with COPY (PostgreSQL) or a
+    multi-row INSERT (other backends)."""
+
+    def __init__(self, db: AsyncSession, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.categories = {}
+        self.rows = 0
+        self.imported = 0
+        self.categories_created = 0
+        self.errors = []
+        self.failed = 0
+
+    def error(self, line: int, detail: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    async def load_categories(self):
+        rows = await self.db.execute(select(models.NoteCategory.category_name, models.NoteCategory.id)
+                                     .filter_by(user_id=self.user_id))
+        self.categories = dict(rows.all())
+
+    async def _create_categories(self, names: set):
+        # A category created since load_categories is picked up rather than failing the import.
+        insert = DIALECT_INSERT[self.db.bind.dialect.name]
+        created = await self.db.execute(
+            insert(models.NoteCategory)
+            .values([{"user_id": self.user_id, "category_name": name} for name in sorted(names)])
+            .on_conflict_do_nothing(index_elements=["user_id", "category_name"])
+            .returning(models.NoteCategory.category_name, models.NoteCategory.id))
+        created = dict(created.all())
+        self.categories.update(created)
+        self.categories_created += len(created)
+        if len(created) < len(names):
+            existing = await self.db.execute(
+                select(models.NoteCategory.category_name, models.NoteCategory.id)
+                .filter_by(user_id=self.user_id)
+                .where(models.NoteCategory.category_name.in_(names - created.keys())))
+            self.categories.update(existing.all())
+
+    async def _copy(self, records: list):
+        connection = await self.db.connection()
+        if connection.dialect.name == "postgresql":
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                models.Notes.__tablename__, records=records, columns=COPY_COLUMNS)
+        else:
+            await self.db.execute(insert(models.Notes), 
+                                  [dict(zip(COPY_COLUMNS, record)) for record in records])
+
+    async def flush(self, notes: list):
+        if not notes:
+            return
+        missing = {note[2] for note in notes} - self.categories.keys()
+        if missing:
+            await self._create_categories(missing)
+        # One change token for the whole chunk instead of one per row from the trigger.
+        change_seq = await self.db.scalar(update(models.Users).filter_by(id=self.user_id)
+                                          .values(change_seq=models.Users.change_seq + 1)
+                                          .returning(models.Users.change_seq))
+        await self._copy([(self.user_id, title, content, self.categories[category_name], 
+                           bookmark, date_created, date_modified, change_seq) 
+                          for title, content, category_name, bookmark, date_created, date_modified 
+                          in notes])
+        self.imported += len(notes)
+
+    def report(self):
+        return {"rows": self.rows, "imported": self.imported, "failed": self.failed, 
+                "categories_created": self.categories_created, "errors": self.errors, 
+                "errors_truncated": self.failed > len(self.errors)}
+
+
+async def import_notes(db: AsyncSession, user_id: int, stream, format: str):
+    """Spool an NDJSON or CSV upload, then load it into the user's notebook in a
+    single transaction. Invalid rows are skipped and reported by line number."""
+    async with spool(stream) as file:
+        return await _import(db, user_id, _chunks(file), format)
+
+
+async def _import(db: AsyncSession, user_id: int, stream, format: str):
+    importer = NoteImporter(db, user_id)
+    await importer.load_categories()
+    imported_at = datetime.now(timezone.utc)
+    records = _ndjson_records(stream) if format == "ndjson" else _csv_records(stream)
+
+    chunk = []
+    async for line, record in records:
+        importer.rows += 1
+        try:
+            if isinstance(record, RowError):
+                raise record
+            chunk.append(_parse_note(record, imported_at))
+        except RowError as exc:
+            importer.error(line, str(exc))
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await importer.flush(chunk)
+            chunk = []
+    await importer.flush(chunk)
+    if importer.imported:
+        # Too many to list one by one: have clients catch up through /sync/changes.
+        changefeed.publish(db, user_id, "resync")
+    await db.commit()
+    return importer.report()
@@ -1,17 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from config import settings
+from content_encoding import CompressionMiddleware
+from metrics import MetricsMiddleware, instrument_engine
+from health import health_checks
+import changefeed, database, revisions, sql_debug
 
 
-from ROUTER.root import router as root_router
+from ROUTER.root import router as root_router, build_route_catalogue
 from ROUTER.auth import router as auth_router
 from ROUTER.note import router as note_router
 from ROUTER.user import router as user_router
 from ROUTER.category import router as category_router
+from ROUTER.sync import router as sync_router
+from ROUTER.attachment import router as attachment_router
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.route_catalogue = build_route_catalogue(app)
+    for check in health_checks():
+        check.start()
+    changefeed.broker.start()
+    revisions.compactor.start()
+    yield
+    await revisions.compactor.stop()
+    await changefeed.broker.stop()
+    for check in health_checks():
+        await check.stop()
+    await database.dispose_engines()
+
 
 app = FastAPI(title= "NOTE APP", 
-              description="A REST API for note-keeping and documentation web service")
+              description="A REST API for note-keeping and documentation web service", 
+              default_response_class=ORJSONResponse, 
+              lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,8 +46,35 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size = settings.compression_minimum_size,
+    offload_size = settings.compression_offload_size,
+    levels = {"gzip": settings.compression_gzip_level, 
+              "br": settings.compression_brotli_quality, 
+              "zstd": settings.compression_zstd_level}
+)
+
+if settings.sql_debug:
+    app.add_middleware(sql_debug.SQLDebugMiddleware, 
+                       repeat_threshold = settings.sql_debug_repeat_threshold)
+    sql_debug.instrument_engine(database.engine)
+    sql_debug.instrument_engine(database.write_engine)
+    for replica in database.replicas:
+        sql_debug.instrument_engine(replica.engine)
+
+# Outermost, so request latency covers the other middleware too.
+app.add_middleware(MetricsMiddleware)
+instrument_engine(database.engine)
+if database.write_engine is not database.engine:
+    instrument_engine(database.write_engine, "writer")
+for replica in database.replicas:
+    instrument_engine(replica.engine, replica.name)
+
 app.include_router(root_router)
 app.include_router(auth_router)
 app.include_router(note_router)
 app.include_router(user_router)
-app.include_router(category_router)
\ No newline at end of file
+app.include_router(category_router)
+app.include_router(sync_router)
+app.include_router(attachment_router)
\ No newline at end of file
@@ -0,0 +1,218 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Collectors are plain dicts keyed by label values. Everything that updates them
+# (requests, SQLAlchemy events, the hashing executor callback) runs on the event
+# loop thread, so they take no locks and an update costs a dict lookup or two.
+REGISTRY = []
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 7.5, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: Optional[tuple] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(),
+                 collect: Optional[Callable[[], dict]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # A collect callback returns {label values: value} at scrape time, for
+        # numbers that already live somewhere else (pool status, cache stats).
+        self.collect = collect
+        self.values = {}
+        REGISTRY.append(self)
+
+    def render(self) -> list:
+        values = self.collect() if self.collect else self.values
+        return [f"{self.name}{_labels(self.labelnames, labels)} {value}"
+                for labels, value in values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            # Per-bucket (not cumulative) counts, then the sum.
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list:
+        lines = []
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', bound))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.",
+                   ["method", "route", "status"])
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route.",
+                            ["method", "route"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served.", ["method"])
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request.",
+                            ["method", "route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL per request.",
+                               ["method", "route"])
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQL statement latency.", ["engine"])
+POOL_ACQUIRE_SECONDS = Histogram("db_pool_acquire_seconds",
+                                 "Time to get a pooled connection, including waits and connects.",
+                                 ["engine"])
+
+_engines = {}
+
+
+def _pool_status(attribute: str) -> Callable[[], dict]:
+    def collect():
+        return {(name,): getattr(engine.pool, attribute)() for name, engine in _engines.items()
+                if hasattr(engine.pool, attribute)}
+    return collect
+
+
+Gauge("db_pool_checked_out", "Connections currently checked out of the pool.", ["engine"],
+      collect=_pool_status("checkedout"))
+Gauge("db_pool_overflow", "Connections open beyond pool_size (negative: unused capacity).",
+      ["engine"], collect=_pool_status("overflow"))
+Gauge("db_pool_size", "Configured pool size.", ["engine"], collect=_pool_status("size"))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """Time every statement and pool checkout on an (async) engine."""
+    sync_engine = engine.sync_engine
+    _engines[name] = sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        DB_QUERY_SECONDS.observe(elapsed, name)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    # Pools have no "checkout requested" event, so wrap the pool's own getter to
+    # time how long callers wait for a connection.
+    pool = sync_engine.pool
+    acquire = pool._do_get
+
+    def timed_acquire():
+        started = time.perf_counter()
+        try:
+            return acquire()
+        finally:
+            POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - started, name)
+
+    pool._do_get = timed_acquire
+
+
+class MetricsMiddleware:
+    """Record count, latency and SQL usage per route template (not raw path, so
+    /notes/1 and /notes/2 share one series)."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        IN_FLIGHT.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec(method)
+            request_stats.reset(token)
+            # The router stores the matched route in the (shared) scope.
+            route = scope.get("route")
+            path = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUESTS.inc(method, path, status)
+            REQUEST_SECONDS.observe(elapsed, method, path)
+            REQUEST_QUERIES.observe(stats.queries, method, path)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method, path)
@@ -1,8 +1,29 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, func, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import (Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, 
+                        Index, DDL, event, false, text)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.sql.expression import FunctionElement
 from database import Base
 
 
+class utcnow(FunctionElement):
+    """now(), except that SQLite gets its timestamp in the text format SQLAlchemy
+    writes datetimes in. CURRENT_TIMESTAMP has no fractional part, so it sorts
+    before an equal bound datetime and keyset cursors would skip or repeat rows."""
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    return "now()"
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
 class Users(Base):
     __tablename__ = "users"
     
@@ -11,7 +32,9 @@ class Users(Base):
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     date_created = Column(DateTime(timezone=True), nullable=False, 
-                          server_default=func.now())
+                          server_default=utcnow())
+    # Last change token handed out for this user; see CHANGE_TRACKING_DDL below.
+    change_seq = Column(BigInteger, nullable=False, server_default="0")
     
     notes = relationship("Notes", back_populates="user", cascade="all, delete")
     note_categories = relationship("NoteCategory", back_populates="user", 
@@ -23,10 +46,14 @@ class NoteCategory(Base):
     id = Column(Integer, primary_key=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     category_name = Column(String, nullable=False)
+    change_seq = Column(BigInteger, nullable=False, server_default="0")
     
     notes = relationship("Notes", back_populates="note_category")
     user = relationship("Users", back_populates="note_categories")
 
+    __table_args__ = (Index("ix_note_categories_user_id_change_seq", "user_id", "change_seq"),
+                      Index("uq_note_categories_user_id_category_name", "user_id", "category_name",
+                            unique=True))
     
 
 class Notes(Base):
@@ -35,13 +62,181 @@ class Notes(Base):
     id = Column(Integer, primary_key=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String, nullable=False)
-    content = Column(String, nullable=False)
+    # Only single-note responses need the body; they opt in with undefer(Notes.content).
+    content = deferred(Column(String, nullable=False), raiseload=True)
     category_id = Column(Integer, ForeignKey("note_categories.id", ondelete="SET NULL"), nullable=False,
                          server_default= "1" )
-    date_created=Column(DateTime(timezone=True), nullable=False, server_default=func.now())
-    date_modified=Column(DateTime(timezone=True), nullable=False, server_default=func.now(), 
-                         server_onupdate=func.now())
-    bookmark = Column(Boolean, nullable=False, server_default="false")
+    date_created=Column(DateTime(timezone=True), nullable=False, server_default=utcnow())
+    date_modified=Column(DateTime(timezone=True), nullable=False, server_default=utcnow(), 
+                         onupdate=utcnow())
+    bookmark = Column(Boolean, nullable=False, server_default=false())
+    change_seq = Column(BigInteger, nullable=False, server_default="0")
     
     user = relationship("Users", back_populates="notes")
-    note_category = relationship("NoteCategory", back_populates="notes")
\ No newline at end of file
+    note_category = relationship("NoteCategory", back_populates="notes")
+
+    # The list endpoints filter on these and page by (date_modified, id), so each
+    # page is a range scan of one index; see tests/test_query_plans.py.
+    __table_args__ = (Index("ix_notes_user_id_change_seq", "user_id", "change_seq"),
+                      Index("ix_notes_user_id_date_modified", "user_id", "date_modified", "id"),
+                      Index("ix_notes_category_id_date_modified", "category_id", "date_modified", "id"),
+                      Index("ix_notes_user_id_date_modified_bookmarked", "user_id", "date_modified", 
+                            "id", postgresql_where=text("bookmark"), 
+                            sqlite_where=text("bookmark = 1")))
+
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    
+    id = Column(Integer, primary_key=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    change_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=utcnow())
+
+    __table_args__ = (Index("ix_sync_tombstones_user_id_change_seq", "user_id", "change_seq"),)
+
+
+class NoteRevision(Base):
+    __tablename__ = "note_revisions"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    revision = Column(Integer, nullable=False)
+    title = Column(String, nullable=False)
+    # A snapshot holds the full content, every other revision a delta against the one
+    # before it; depth counts the deltas back to the snapshot. See revisions.py.
+    content = Column(String, nullable=True)
+    delta = Column(String, nullable=True)
+    depth = Column(Integer, nullable=False)
+    content_length = Column(Integer, nullable=False)
+    content_hash = Column(String, nullable=False)
+    date_created = Column(DateTime(timezone=True), nullable=False, server_default=utcnow())
+
+    __table_args__ = (Index("uq_note_revisions_note_id_revision", "note_id", "revision",
+                            unique=True),)
+
+
+class AttachmentBlob(Base):
+    __tablename__ = "attachment_blobs"
+
+    # One row per file in the blob store, named by the SHA-256 of its bytes; see
+    # attachments.py. Attachments reference it, so a blob in use cannot be dropped.
+    sha256 = Column(String, primary_key=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    date_created = Column(DateTime(timezone=True), nullable=False, server_default=utcnow())
+
+
+class NoteAttachment(Base):
+    __tablename__ = "note_attachments"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    note_id = Column(Integer, ForeignKey("notes.id", ondelete="CASCADE"), nullable=False)
+    sha256 = Column(String, ForeignKey("attachment_blobs.sha256"), nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    date_created = Column(DateTime(timezone=True), nullable=False, server_default=utcnow())
+
+    __table_args__ = (Index("ix_note_attachments_note_id", "note_id", "id"),
+                      Index("ix_note_attachments_sha256", "sha256"))
+
+
+# Full-text search index. On PostgreSQL this is a generated tsvector column with a
+# GIN index; on SQLite an external-content FTS5 table kept in sync by triggers.
+# Production schemas get the same objects from the Alembic revision.
+POSTGRES_SEARCH_DDL = [
+    "ALTER TABLE notes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX ix_notes_search_vector ON notes USING gin (search_vector)",
+]
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, content='notes', "
+    "content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER notes_fts_ai AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER notes_fts_ad AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+]
+
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(Notes.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Notes.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Notes.__table__, "after_drop",
+             DDL("DROP TABLE IF EXISTS notes_fts").execute_if(dialect="sqlite"))
+
+
+# Change tracking for delta sync. Every insert or update of a note or category takes
+# the next value of its owner's users.change_seq, and every delete leaves a tombstone
+# carrying one. Bumping a per-user row also serialises that user's writers, so a
+# token never skips a change that was still uncommitted when it was issued.
+# A writer that sets change_seq itself (the bulk importer) is left alone.
+POSTGRES_CHANGE_TRACKING_DDL = [
+    """CREATE FUNCTION bump_change_seq() RETURNS trigger AS $$
+    BEGIN
+        IF (TG_OP = 'INSERT' AND NEW.change_seq <> 0) 
+           OR (TG_OP = 'UPDATE' AND NEW.change_seq <> OLD.change_seq) THEN
+            RETURN NEW;
+        END IF;
+        UPDATE users SET change_seq = change_seq + 1 WHERE id = NEW.user_id 
+            RETURNING change_seq INTO NEW.change_seq;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE FUNCTION record_tombstone() RETURNS trigger AS $$
+    DECLARE seq bigint;
+    BEGIN
+        -- No owner row means the whole account is being deleted: nothing to sync.
+        UPDATE users SET change_seq = change_seq + 1 WHERE id = OLD.user_id 
+            RETURNING change_seq INTO seq;
+        IF FOUND THEN
+            INSERT INTO sync_tombstones (user_id, kind, entity_id, change_seq) 
+            VALUES (OLD.user_id, TG_ARGV[0], OLD.id, seq);
+        END IF;
+        RETURN OLD;
+    END $$ LANGUAGE plpgsql""",
+    "CREATE TRIGGER notes_change_seq BEFORE INSERT OR UPDATE ON notes "
+    "FOR EACH ROW EXECUTE FUNCTION bump_change_seq()",
+    "CREATE TRIGGER note_categories_change_seq BEFORE INSERT OR UPDATE ON note_categories "
+    "FOR EACH ROW EXECUTE FUNCTION bump_change_seq()",
+    "CREATE TRIGGER notes_tombstone AFTER DELETE ON notes "
+    "FOR EACH ROW EXECUTE FUNCTION record_tombstone('note')",
+    "CREATE TRIGGER note_categories_tombstone AFTER DELETE ON note_categories "
+    "FOR EACH ROW EXECUTE FUNCTION record_tombstone('category')",
+]
+
+
+def _sqlite_change_tracking_ddl(table: str, kind: str):
+    next_seq = ("UPDATE users SET change_seq = change_seq + 1 WHERE id = {row}.user_id; ")
+    stamp = (f"UPDATE {table} SET change_seq = "
+             f"(SELECT change_seq FROM users WHERE id = NEW.user_id) WHERE id = NEW.id; ")
+    return [
+        f"CREATE TRIGGER {table}_change_seq_ai AFTER INSERT ON {table} "
+        f"WHEN NEW.change_seq = 0 BEGIN " + next_seq.format(row="NEW") + stamp + "END",
+        f"CREATE TRIGGER {table}_change_seq_au AFTER UPDATE ON {table} "
+        f"WHEN NEW.change_seq = OLD.change_seq BEGIN " + next_seq.format(row="NEW") + stamp + "END",
+        f"CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} "
+        f"WHEN EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id) BEGIN " 
+        + next_seq.format(row="OLD") +
+        f"INSERT INTO sync_tombstones (user_id, kind, entity_id, change_seq) "
+        f"SELECT OLD.user_id, '{kind}', OLD.id, change_seq FROM users WHERE id = OLD.user_id; END",
+    ]
+
+SQLITE_CHANGE_TRACKING_DDL = (_sqlite_change_tracking_ddl("notes", "note") 
+                              + _sqlite_change_tracking_ddl("note_categories", "category"))
+
+for statement in POSTGRES_CHANGE_TRACKING_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_CHANGE_TRACKING_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "after_drop", 
+             DDL("DROP FUNCTION IF EXISTS bump_change_seq, record_tombstone")
+             .execute_if(dialect="postgresql"))
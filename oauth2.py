@@ -1,10 +1,11 @@
 from jose import jwt, JWTError
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, WebSocketException, status, Depends, Query
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, timezone
 from config import settings
-import database, models, schemas
+import cache, database, models, schemas
 
 Oauth2_scheme = OAuth2PasswordBearer(tokenUrl="user/login", scheme_name="OAuth2PasswordBearer")
 refresh_Oauth2_scheme = OAuth2PasswordBearer(tokenUrl="user/refresh", 
@@ -38,7 +39,20 @@ def check_token_kind(token_kind: str, expected_token_kind: str, credential_excep
     if token_kind != expected_token_kind:
         raise credential_exception
     
-def get_current_user(token:str = Depends(Oauth2_scheme), db: Session = Depends(database.get_db)):
+async def load_principal(user_id: int, db: AsyncSession):
+    principal = await cache.principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    user = (await db.execute(select(models.Users.id, models.Users.username, models.Users.email)
+                             .filter_by(id = user_id))).first()
+    if user is None:
+        return None
+    principal = schemas.Principal.model_validate(user)
+    await cache.principal_cache.set(user_id, principal)
+    return principal
+    
+async def get_current_user(token:str = Depends(Oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
     
     credential_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
                                          detail="Could not validate credentials", 
@@ -46,14 +60,16 @@ def get_current_user(token:str = Depends(Oauth2_scheme), db: Session = Depends(d
     
     user_data = verify_token(token, credential_exception)
     check_token_kind(user_data.token_kind,"access_token", credential_exception)
+    # Lets the session keep this user's reads on the primary right after a write.
+    db.info["user_id"] = user_data.user_id
 
-    user = db.query(models.Users).filter_by(id = user_data.user_id).first()
+    user = await load_principal(user_data.user_id, db)
     if user is None:
         raise credential_exception
     return user
 
-def get_current_user_from_refresh(token:str = Depends(refresh_Oauth2_scheme), 
-                                  db: Session = Depends(database.get_db)):
+async def get_current_user_from_refresh(token:str = Depends(refresh_Oauth2_scheme), 
+                                        db: AsyncSession = Depends(database.get_db)):
     
     credential_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, 
                                          detail="Could not validate credentials", 
@@ -62,7 +78,23 @@ def get_current_user_from_refresh(token:str = Depends(refresh_Oauth2_scheme),
     user_data = verify_token(token, credential_exception)
     check_token_kind(user_data.token_kind,"refresh_token", credential_exception)
     
-    user = db.query(models.Users).filter_by(id = user_data.user_id).first()
+    user = await load_principal(user_data.user_id, db)
     if user is None:
         raise credential_exception
-    return user
\ No newline at end of file
+    return user
+
+async def get_current_user_from_websocket(access_token: str = Query(...)):
+    # Browsers cannot set headers on a WebSocket, so the token comes in the query
+    # string. The session is our own and closed here: get_db's would stay open
+    # for as long as the socket does.
+    credential_exception = WebSocketException(code=status.WS_1008_POLICY_VIOLATION, 
+                                              reason="Could not validate credentials")
+    
+    user_data = verify_token(access_token, credential_exception)
+    check_token_kind(user_data.token_kind,"access_token", credential_exception)
+    
+    async with database.SessionLocal() as db:
+        user = await load_principal(user_data.user_id, db)
+    if user is None:
+        raise credential_exception
+    return user
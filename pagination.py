@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Query, status
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+NOTE_ORDER = [models.Notes.date_modified, models.Notes.id]
+CATEGORY_ORDER = [models.NoteCategory.id]
+
+
+class PageParams:
+    def __init__(self, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                 cursor: Optional[str] = None):
+        self.limit = limit
+        self.cursor = cursor
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values],
+                     separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    invalid_cursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise invalid_cursor
+        return [datetime.fromisoformat(v) if isinstance(col.type, DateTime) else col.type.python_type(v)
+                for v, col in zip(values, columns)]
+    except (ValueError, TypeError):
+        raise invalid_cursor
+
+
+def page_statement(statement, order_by: list, params: PageParams, descending: bool = False):
+    """The query `paginate` runs: one more row than the page, after the cursor."""
+    if params.cursor:
+        key = tuple_(*order_by)
+        last_seen = tuple_(*decode_cursor(params.cursor, order_by))
+        statement = statement.where(key < last_seen if descending else key > last_seen)
+
+    ordering = [column.desc() if descending else column.asc() for column in order_by]
+    return statement.order_by(*ordering).limit(params.limit + 1)
+
+
+async def paginate(db: AsyncSession, statement, order_by: list, params: PageParams, 
+                   descending: bool = False):
+    """Keyset pagination: the cursor carries the sort key of the last row
+    served, so every page is an index range scan regardless of depth."""
+    result = await db.execute(page_statement(statement, order_by, params, descending))
+    rows = result.scalars().all() if len(statement.column_descriptions) == 1 else result.all()
+
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in order_by])
+    return {"items": rows, "next_cursor": next_cursor}
@@ -0,0 +1,18 @@
+from sqlalchemy import inspect
+
+
+def columns_for(model, schema, *extra) -> list:
+    """The mapped columns of `model` behind the fields of response `schema`, plus
+    any `extra` columns the caller needs (e.g. pagination sort keys).
+
+    Selecting these instead of the entity returns light row tuples that the
+    schema serializes via from_attributes, and leaves every other column,
+    `Notes.content` in particular, in the database."""
+    mapped = inspect(model).column_attrs
+    missing = [name for name in schema.model_fields if name not in mapped]
+    if missing:
+        raise ValueError(f"{schema.__name__} fields not mapped on {model.__name__}: {missing}")
+
+    columns = [getattr(model, name) for name in schema.model_fields]
+    selected = {column.key for column in columns}
+    return columns + [column for column in extra if column.key not in selected]
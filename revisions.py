@@ -0,0 +1,263 @@
+"""Note revision history.
+
+Every edit of a note's title or content adds a revision. Storing each version in
+full would multiply the table, since long notes mostly get small edits, so a
+revision holds a delta against the one before it: [start, end, text] splices of
+the earlier content. Every `revision_max_deltas + 1`-th revision is a full
+snapshot instead, so any version is rebuilt from one snapshot and at most
+`revision_max_deltas` deltas. The compactor enforces the retention settings and
+turns the oldest revision it keeps into a snapshot."""
+import asyncio
+import hashlib
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
+from itertools import accumulate
+from typing import Optional
+import orjson
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+import database, models
+
+logger = logging.getLogger(__name__)
+
+Revision = models.NoteRevision
+Version = namedtuple("Version", ["title", "content"])
+# Line matching is quadratic in the worst case; past this, one splice covers
+# everything between the first and the last change.
+MAX_DIFF_LINES = 2000
+
+
+def _common_prefix(a: str, b: str) -> int:
+    # Binary search over slice comparisons: a memcmp per step instead of a Python
+    # loop per character, which matters for megabyte notes.
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(a: str, b: str, limit: int) -> int:
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:len(a) - low] == b[len(b) - middle:len(b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def diff(old: str, new: str) -> list:
+    """Splices [start, end, text] that turn `old` into `new`: each replaces
+    old[start:end] with text. They are in order and do not overlap."""
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    old_middle, new_middle = old[prefix:len(old) - suffix], new[prefix:len(new) - suffix]
+    if not old_middle and not new_middle:
+        return []
+
+    old_lines, new_lines = old_middle.splitlines(True), new_middle.splitlines(True)
+    if min(len(old_lines), len(new_lines)) < 2 or max(len(old_lines), len(new_lines)) > MAX_DIFF_LINES:
+        return [[prefix, prefix + len(old_middle), new_middle]]
+    # Changes in several places: keep the lines between them out of the delta.
+    offsets = list(accumulate(map(len, old_lines), initial=prefix))
+    return [[offsets[i1], offsets[i2], "".join(new_lines[j1:j2])]
+            for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_lines, new_lines).get_opcodes()
+            if tag != "equal"]
+
+
+def patch(content: str, splices: list) -> str:
+    parts, position = [], 0
+    for start, end, text in splices:
+        parts += (content[position:start], text)
+        position = end
+    parts.append(content[position:])
+    return "".join(parts)
+
+
+def digest(content: str) -> str:
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def _snapshot(note_id: int, revision: int, version) -> dict:
+    return {"note_id": note_id, "revision": revision, "title": version.title,
+            "content": version.content, "delta": None, "depth": 0,
+            "content_length": len(version.content), "content_hash": digest(version.content)}
+
+
+async def record(db: AsyncSession, note_id: int, before, after, max_deltas: Optional[int] = None):
+    """Add the revision for an edit from `before` to `after` (Versions, or rows
+    with a title and content). Run it in the editing transaction with the note row
+    locked, so concurrent edits of a note chain their deltas in order."""
+    max_deltas = settings.revision_max_deltas if max_deltas is None else max_deltas
+    if (before.title, before.content) == (after.title, after.content):
+        return
+
+    latest = (await db.execute(select(Revision.revision, Revision.depth, Revision.content_hash)
+                               .filter_by(note_id=note_id)
+                               .order_by(Revision.revision.desc()).limit(1))).first()
+    revision, depth = (latest.revision, latest.depth) if latest else (0, 0)
+    rows = []
+    if latest is None or latest.content_hash != digest(before.content):
+        # History does not end at the version being replaced: the note predates it,
+        # or batch or import changed it since. Keep that version in full first.
+        revision, depth = revision + 1, 0
+        rows.append(_snapshot(note_id, revision, before))
+
+    revision += 1
+    delta = orjson.dumps(diff(before.content, after.content)).decode()
+    if depth >= max_deltas or len(delta) >= len(after.content):
+        rows.append(_snapshot(note_id, revision, after))
+    else:
+        rows.append({"note_id": note_id, "revision": revision, "title": after.title,
+                     "content": None, "delta": delta, "depth": depth + 1,
+                     "content_length": len(after.content), "content_hash": digest(after.content)})
+    await db.execute(insert(Revision), rows)
+
+
+async def update_note(db: AsyncSession, statement, note_id: int, user_id: int) -> tuple:
+    """Run `statement`, an UPDATE of one note RETURNING models.Notes, and return
+    the updated note with the Version it replaced, or (None, None) if nothing
+    matched. On PostgreSQL the old row comes from a locked subquery of the UPDATE
+    itself, so an edit stays one round trip. SQLite's RETURNING cannot see other
+    tables, so the old row is read first; that read is in-process, on the writer
+    connection that BEGIN IMMEDIATE has already locked."""
+    if db.bind.dialect.name == "sqlite":
+        previous = (await db.execute(select(models.Notes.title, models.Notes.content)
+                                     .filter_by(id=note_id, user_id=user_id)
+                                     .with_for_update())).first()
+        return await db.scalar(statement), previous
+
+    previous = (select(models.Notes.id, models.Notes.title, models.Notes.content)
+                .filter_by(id=note_id, user_id=user_id).with_for_update().subquery("previous"))
+    row = (await db.execute(statement.where(models.Notes.id == previous.c.id)
+                            .returning(previous.c.title, previous.c.content))).first()
+    return (row[0], Version(row[1], row[2])) if row else (None, None)
+
+
+async def load(db: AsyncSession, note_id: int, revision: int) -> Optional[dict]:
+    """Rebuild `revision` from the snapshot at or before it and the deltas after it."""
+    snapshot = (select(func.max(Revision.revision))
+                .where(Revision.note_id == note_id, Revision.revision <= revision,
+                       Revision.depth == 0)
+                .scalar_subquery())
+    rows = (await db.execute(select(Revision.revision, Revision.title, Revision.content,
+                                    Revision.delta, Revision.date_created)
+                             .where(Revision.note_id == note_id, Revision.revision >= snapshot,
+                                    Revision.revision <= revision)
+                             .order_by(Revision.revision))).all()
+    if not rows or rows[-1].revision != revision:
+        return None
+    content = rows[0].content
+    for row in rows[1:]:
+        content = patch(content, orjson.loads(row.delta))
+    return {"revision": revision, "title": rows[-1].title, "content": content,
+            "date_created": rows[-1].date_created}
+
+
+async def compact_note(db: AsyncSession, note_id: int, keep_from: int):
+    """Drop the revisions of a note before `keep_from`, rebuilding that one as a
+    snapshot first if it is a delta."""
+    depth = await db.scalar(select(Revision.depth).filter_by(note_id=note_id, revision=keep_from))
+    if depth:
+        rebuilt = await load(db, note_id, keep_from)
+        if rebuilt is None:
+            # The chain behind it is incomplete; deleting its base would lose it for good.
+            logger.warning("Revision %s of note %s cannot be rebuilt; not compacting it",
+                           keep_from, note_id)
+            return
+        # Matching on depth makes this a no-op when another worker got here first.
+        converted = await db.execute(update(Revision)
+                                     .filter_by(note_id=note_id, revision=keep_from, depth=depth)
+                                     .values(content=rebuilt["content"], delta=None, depth=0))
+        if converted.rowcount:
+            next_snapshot = await db.scalar(select(func.min(Revision.revision))
+                                            .where(Revision.note_id == note_id,
+                                                   Revision.revision > keep_from,
+                                                   Revision.depth == 0))
+            chain = update(Revision).where(Revision.note_id == note_id,
+                                           Revision.revision > keep_from)
+            if next_snapshot is not None:
+                chain = chain.where(Revision.revision < next_snapshot)
+            await db.execute(chain.values(depth=Revision.depth - depth))
+    await db.execute(delete(Revision).where(Revision.note_id == note_id,
+                                            Revision.revision < keep_from))
+
+
+async def compact(max_count: Optional[int] = None, retention_days: Optional[float] = None) -> int:
+    """Apply the retention settings: at most `max_count` revisions per note and
+    none older than `retention_days`, except that a note's newest revision is
+    always kept (0 disables either limit). Returns the number of notes compacted;
+    each is done in a transaction of its own."""
+    max_count = settings.revision_max_count if max_count is None else max_count
+    retention_days = settings.revision_retention_days if retention_days is None else retention_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days) if retention_days else None
+
+    over_limit = []
+    if max_count:
+        over_limit.append(func.max(Revision.revision) - func.min(Revision.revision) >= max_count)
+    if cutoff:
+        over_limit.append(func.min(Revision.date_created) < cutoff)
+    if not over_limit:
+        return 0
+
+    async with database.SessionLocal() as db:
+        candidates = (await db.execute(select(Revision.note_id,
+                                              func.max(Revision.revision).label("latest"))
+                                       .group_by(Revision.note_id)
+                                       .having(or_(*over_limit)))).all()
+    for candidate in candidates:
+        async with database.SessionLocal() as db:
+            keep_from = candidate.latest - max_count + 1 if max_count else 0
+            if cutoff:
+                first_recent = await db.scalar(select(func.min(Revision.revision))
+                                               .where(Revision.note_id == candidate.note_id,
+                                                      Revision.date_created >= cutoff))
+                keep_from = max(keep_from, first_recent or candidate.latest)
+            await compact_note(db, candidate.note_id, min(keep_from, candidate.latest))
+            await db.commit()
+    return len(candidates)
+
+
+class RevisionCompactor:
+    """Runs `compact` every `interval` seconds from a background task."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await compact()
+            except (OSError, SQLAlchemyError) as exc:
+                # The database is unavailable; the next run catches up.
+                logger.warning("Revision compaction failed: %r", exc)
+            except Exception:
+                # Anything else would end the task and stop compaction for good.
+                logger.exception("Revision compaction failed")
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="revision-compactor")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+compactor = RevisionCompactor(settings.revision_compaction_interval)
@@ -1,5 +1,8 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
-from typing import Optional
+from typing import Annotated, Generic, List, Literal, Optional, TypeVar, Union
+from datetime import datetime
+
+T = TypeVar("T")
 
 class UserCreated(BaseModel):
     username: str
@@ -14,6 +17,15 @@ class UserOut(BaseModel):
     class Config:
        from_attributes = True
 
+class Principal(BaseModel):
+    id: int
+    username: str
+    email: EmailStr
+    
+    class Config:
+       from_attributes = True
+       frozen = True
+
 class UserEdit(BaseModel):
     username: Optional[str] = None
     email: Optional[EmailStr] = None
@@ -78,6 +90,23 @@ class AllNoteOut(BaseModel):
     class Config:
         from_attributes = True  
 
+class NoteSearchHit(BaseModel):
+    id: int
+    title: str
+    snippet: str
+    rank: float
+    
+    class Config:
+        from_attributes = True
+
+class CategoryOut(BaseModel):
+    id: int
+    category_name: str
+    change_seq: int
+    
+    class Config:
+        from_attributes = True
+
 class AllCategoryOut(BaseModel):
     id: int
     category_name: str
@@ -85,10 +114,68 @@ class AllCategoryOut(BaseModel):
     class Config:
         from_attributes = True      
 
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
 class EditNote(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
     
+class BatchCreate(BaseModel):
+    op: Literal["create"]
+    title: str
+    content: str
+    category_id: Optional[int] = None
+
+class BatchUpdate(BaseModel):
+    op: Literal["update"]
+    note_id: int
+    title: Optional[str] = None
+    content: Optional[str] = None
+
+class BatchDelete(BaseModel):
+    op: Literal["delete"]
+    note_id: int
+
+class BatchBookmark(BaseModel):
+    op: Literal["bookmark"]
+    note_id: int
+    bookmark: bool
+
+class BatchMove(BaseModel):
+    op: Literal["move"]
+    note_id: int
+    category_id: int
+
+BatchOperation = Annotated[Union[BatchCreate, BatchUpdate, BatchDelete, BatchBookmark, BatchMove], 
+                           Field(discriminator="op")]
+
+class NoteBatch(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=500)
+
+class BatchResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    note_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class BatchOut(BaseModel):
+    results: List[BatchResult]
+    
+class ImportRowError(BaseModel):
+    line: int
+    detail: str
+
+class ImportReport(BaseModel):
+    rows: int
+    imported: int
+    failed: int
+    categories_created: int
+    errors: List[ImportRowError]
+    errors_truncated: bool
+    
 class EditCategory(BaseModel):
     category_name: str
     
@@ -115,4 +202,90 @@ class CategoryCreated(BaseModel):
     
 class ChangePassword(BaseModel):
     current_password: str = Field(..., min_length=8)
-    new_password: str = Field(..., min_length=8)
\ No newline at end of file
+    new_password: str = Field(..., min_length=8)
+
+class NoteChange(BaseModel):
+    id: int
+    title: str
+    content: str
+    category_id: Optional[int] = None
+    bookmark: bool
+    date_modified: datetime
+    
+    class Config:
+        from_attributes = True
+
+class CategoryChange(BaseModel):
+    id: int
+    category_name: str
+    
+    class Config:
+        from_attributes = True
+
+class DeletedEntity(BaseModel):
+    kind: Literal["note", "category"]
+    id: int
+
+class RevisionOut(BaseModel):
+    revision: int
+    title: str
+    content_length: int
+    date_created: datetime
+    
+    class Config:
+        from_attributes = True
+
+class RevisionDetail(BaseModel):
+    revision: int
+    title: str
+    content: str
+    date_created: datetime
+
+class AppendOp(BaseModel):
+    op: Literal["append"]
+    text: str
+
+class InsertOp(BaseModel):
+    op: Literal["insert"]
+    offset: int = Field(..., ge=0)
+    text: str
+
+class DeleteOp(BaseModel):
+    op: Literal["delete"]
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+
+class ReplaceOp(BaseModel):
+    op: Literal["replace"]
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    text: str
+
+ContentOp = Annotated[Union[AppendOp, InsertOp, DeleteOp, ReplaceOp], Field(discriminator="op")]
+
+class ContentPatch(BaseModel):
+    ops: List[ContentOp] = Field(..., min_length=1, max_length=100)
+
+class NoteVersion(BaseModel):
+    id: int
+    change_seq: int
+    content_length: int
+    date_modified: datetime
+
+class AttachmentOut(BaseModel):
+    id: int
+    note_id: int
+    filename: str
+    content_type: str
+    size: int
+    date_created: datetime
+
+    class Config:
+       from_attributes = True
+
+class SyncChanges(BaseModel):
+    notes: List[NoteChange]
+    categories: List[CategoryChange]
+    deleted: List[DeletedEntity]
+    next_token: str
+    has_more: bool
\ No newline at end of file
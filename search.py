@@ -0,0 +1,68 @@
+import html
+import re
+from sqlalchemy import Float, column, func, literal_column, select, table
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+from pagination import PageParams, paginate
+
+SEARCH_CONFIG = "english"
+# The database marks matches with private-use characters, not tags: the snippet is
+# note content, so it is HTML-escaped first and the markers become <mark> after.
+HIGHLIGHT_START = "\ue000"
+HIGHLIGHT_STOP = "\ue001"
+SNIPPET_WORDS = 16
+
+notes_fts = table("notes_fts", column("rowid"))
+
+
+def _postgres_query(user_id: int, q: str):
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    search_vector = literal_column("notes.search_vector", TSVECTOR)
+    headline_options = (f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, "
+                        f"MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}")
+
+    rank = func.ts_rank_cd(search_vector, tsquery, type_=Float).label("rank")
+    snippet = func.ts_headline(SEARCH_CONFIG, models.Notes.content, tsquery, 
+                               headline_options).label("snippet")
+    statement = select(models.Notes.id, models.Notes.title, snippet, rank).where(
+        models.Notes.user_id == user_id, search_vector.op("@@")(tsquery))
+    return statement, rank
+
+
+def _fts5_match(q: str):
+    # Quote every term so user input can never be parsed as FTS5 syntax. Terms are
+    # ANDed and a bare OR between terms is kept, as websearch_to_tsquery does.
+    groups = [" ".join(f'"{term}"' for term in re.findall(r"\w+", group))
+              for group in re.split(r"\bOR\b", q)]
+    return " OR ".join(f"({group})" for group in groups if group)
+
+
+def _sqlite_query(user_id: int, q: str):
+    fts = literal_column("notes_fts")
+    # bm25 is "lower is better"; negate it so both backends sort rank descending.
+    # Title/content weights mirror the A/B setweight() in the Postgres column.
+    rank = (-func.bm25(fts, 2.0, 1.0, type_=Float)).label("rank")
+    snippet = func.snippet(fts, 1, HIGHLIGHT_START, HIGHLIGHT_STOP, "…", 
+                           SNIPPET_WORDS).label("snippet")
+    statement = select(models.Notes.id, models.Notes.title, snippet, rank).join(
+        notes_fts, notes_fts.c.rowid == models.Notes.id).where(
+        models.Notes.user_id == user_id, fts.op("MATCH")(_fts5_match(q)))
+    return statement, rank
+
+
+async def search_notes(db: AsyncSession, user_id: int, q: str, page: PageParams):
+    if db.bind.dialect.name == "sqlite":
+        if not _fts5_match(q):
+            return {"items": [], "next_cursor": None}
+        statement, rank = _sqlite_query(user_id, q)
+    else:
+        statement, rank = _postgres_query(user_id, q)
+    hits = await paginate(db, statement, [rank, models.Notes.id], page, descending=True)
+    hits["items"] = [(hit.id, hit.title, highlight(hit.snippet), hit.rank) for hit in hits["items"]]
+    return hits
+
+
+def highlight(snippet: str) -> str:
+    return (html.escape(snippet).replace(HIGHLIGHT_START, "<mark>")
+            .replace(HIGHLIGHT_STOP, "</mark>"))
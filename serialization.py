@@ -0,0 +1,50 @@
+from functools import lru_cache
+from typing import Optional
+import orjson
+from fastapi import Response
+from pydantic import TypeAdapter
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+@lru_cache(maxsize=None)
+def adapter(type_) -> TypeAdapter:
+    return TypeAdapter(type_)
+
+
+def dump_json(type_, content) -> bytes:
+    """Validate `content` (ORM objects, rows or dicts) against `type_` and encode
+    it in a single pydantic-core pass, with the adapter built once per type."""
+    type_adapter = adapter(type_)
+    return type_adapter.dump_json(type_adapter.validate_python(content, from_attributes=True))
+
+
+@lru_cache(maxsize=None)
+def _field_names(schema) -> tuple:
+    return tuple(schema.model_fields)
+
+
+def encode_page(schema, page: dict) -> bytes:
+    """Encode a page of rows selected with projection.columns_for(model, schema).
+
+    Those rows hold the schema's fields first and in order, typed by NOT NULL
+    columns, so they are zipped straight into dicts for orjson without a
+    per-item validation step. Trailing sort-key columns are dropped by zip.
+    OPT_UTC_Z writes UTC datetimes with "Z", as pydantic does elsewhere."""
+    fields = _field_names(schema)
+    return orjson.dumps({"items": [dict(zip(fields, row)) for row in page["items"]],
+                         "next_cursor": page["next_cursor"]}, option=orjson.OPT_UTC_Z)
+
+
+def json_response(body: bytes, response: Optional[Response] = None) -> Response:
+    """Wrap pre-encoded JSON. Returning a Response skips FastAPI's own response
+    validation, so headers a dependency set on the injected `response`
+    (ETag, Cache-Control) are carried over here."""
+    fast_response = Response(body, media_type=JSON_MEDIA_TYPE)
+    if response is not None:
+        fast_response.raw_headers.extend(response.headers.raw)
+    return fast_response
+
+
+def page_response(schema, page: dict, response: Optional[Response] = None) -> Response:
+    return json_response(encode_page(schema, page), response)
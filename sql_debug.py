@@ -0,0 +1,157 @@
+"""Opt-in per-request SQL profiling with an N+1 detector.
+
+With `sql_debug=true` every response carries X-SQL-Queries / X-SQL-Time-Ms,
+plus X-SQL-N-Plus-One when one statement shape repeats `sql_debug_repeat_threshold`
+times or more. Tests use `capture_queries`, or the `query_profile` fixture built
+on it in tests/conftest.py:
+
+    def test_list_notes(client, account, query_profile):
+        client.get("/notes/all", headers=account.headers)
+        query_profile.assert_max_queries(3)
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import Counter
+from functools import lru_cache
+from typing import Optional
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\$\d+|%\(\w+\)s|%s|\?|(?<!:):\w+")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """Statement shape with literals, bind parameters and IN/VALUES lists folded,
+    so `... WHERE id = 1` and `... WHERE id = 2` count as the same query."""
+    normalized = _LITERALS.sub("?", _PLACEHOLDERS.sub("?", statement))
+    normalized = _ROWS.sub("(...)", _LISTS.sub("(...)", normalized))
+    return _SPACE.sub(" ", normalized).strip()
+
+
+class QueryProfile:
+    def __init__(self):
+        self.queries = []
+
+    def record(self, statement: str, seconds: float):
+        self.queries.append((fingerprint(statement), statement, seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def repeated(self, threshold: int) -> dict:
+        """SELECT shapes run at least `threshold` times: likely N+1 loops."""
+        counts = Counter(shape for shape, _, _ in self.queries 
+                         if shape.upper().startswith("SELECT"))
+        return {shape: count for shape, count in counts.most_common() if count >= threshold}
+
+    def report(self) -> str:
+        return "\n".join(f"{seconds * 1000:8.2f} ms  {statement}"
+                         for _, statement, seconds in self.queries)
+
+    def assert_max_queries(self, maximum: int):
+        if self.count > maximum:
+            raise AssertionError(f"{self.count} SQL statements, expected at most {maximum}:\n"
+                                 f"{self.report()}")
+
+    def assert_no_n_plus_one(self, threshold: int = 2):
+        suspects = self.repeated(threshold)
+        if suspects:
+            raise AssertionError("Repeated statements (N+1?):\n" + "\n".join(
+                f"{count}x {shape}" for shape, count in suspects.items()))
+
+
+_request_profile: ContextVar[Optional[QueryProfile]] = ContextVar("sql_profile", default=None)
+# Captures opened by tests see statements from every task and thread, since
+# the test client runs the app on its own event loop.
+_captures = []
+_instrumented = set()
+
+
+def instrument_engine(engine):
+    sync_engine = engine.sync_engine
+    if sync_engine in _instrumented:
+        return
+    _instrumented.add(sync_engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        context._sql_debug_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        profile = _request_profile.get()
+        if profile is None and not _captures:
+            return
+        if statement.startswith("BEGIN"):
+            # Only the SQLite engines send BEGIN as a statement (see database.py);
+            # leaving it out makes the counts the same on both backends.
+            return
+        elapsed = time.perf_counter() - context._sql_debug_started
+        if profile is not None:
+            profile.record(statement, elapsed)
+        for capture in _captures:
+            capture.record(statement, elapsed)
+
+
+@contextmanager
+def capture_queries(engine=None):
+    """Record every statement run on `engine` (default: the app's engines) while
+    the block is active."""
+    if engine is None:
+        import database
+        instrument_engine(database.write_engine)
+        engine = database.engine
+    instrument_engine(engine)
+    profile = QueryProfile()
+    _captures.append(profile)
+    try:
+        yield profile
+    finally:
+        _captures.remove(profile)
+
+
+class SQLDebugMiddleware:
+    def __init__(self, app: ASGIApp, repeat_threshold: int = 5):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = QueryProfile()
+
+        async def send_with_profile(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-SQL-Queries"] = str(profile.count)
+                headers["X-SQL-Time-Ms"] = f"{profile.seconds * 1000:.2f}"
+                suspects = profile.repeated(self.repeat_threshold)
+                if suspects:
+                    headers["X-SQL-N-Plus-One"] = " | ".join(
+                        f"{count}x {shape[:200]}" for shape, count in suspects.items())
+                    logger.warning("Possible N+1 on %s %s: %s", scope["method"], scope["path"],
+                                   suspects)
+            await send(message)
+
+        token = _request_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _request_profile.reset(token)
@@ -0,0 +1,88 @@
+"""Test fixtures: the app on a throwaway, migrated SQLite database.
+
+The settings are read when `config` is first imported, so the environment is set
+up here before anything from the app is."""
+import itertools
+import os
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+_workdir = Path(tempfile.mkdtemp(prefix="note-app-tests-"))
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_workdir / 'notes.db'}",
+    "ATTACHMENT_PATH": str(_workdir / "attachments"),
+    "ALGORITHM": "HS256",
+    "SECRET": "test-secret",
+    "ACCESS_TIME": "30",
+    "REFRESH_TIME": "60",
+    "BCRYPT_ROUNDS": "4",
+    # Keep background work from running statements in the middle of a count.
+    "HEALTH_CHECK_INTERVAL": "3600",
+    "REVISION_COMPACTION_INTERVAL": "0",
+})
+os.environ.pop("DATABASE_REPLICA_URLS", None)
+
+_emails = itertools.count(1)
+
+
+def pytest_configure(config):
+    from alembic import command
+    from alembic.config import Config
+
+    # Without an ini file, env.py leaves the logging configuration alone.
+    alembic_config = Config()
+    alembic_config.set_main_option("script_location", str(ROOT / "app_database"))
+    command.upgrade(alembic_config, "head")
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def run(client):
+    """Call an async function on the app's event loop, where its engines live."""
+    return client.portal.call
+
+
+@pytest.fixture
+def account(client):
+    """A new user, logged in, with their auth headers and default category."""
+    email, password = f"user{next(_emails)}@example.com", "password123"
+    client.post("/user/signup", json={"username": "tester", "email": email,
+                                      "password": password}).raise_for_status()
+    token = client.post("/user/login", data={"username": email, "password": password})
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+    # Also puts the user in the principal cache, so requests under test do not
+    # spend a statement on authentication.
+    categories = client.get("/category/all", headers=headers).json()["items"]
+    return SimpleNamespace(email=email, password=password, headers=headers,
+                           category_id=categories[0]["id"])
+
+
+@pytest.fixture
+def note(client, account):
+    response = client.post("/notes/create", headers=account.headers, json={
+        "title": "Groceries", "content": "milk, eggs", "category_id": account.category_id})
+    response.raise_for_status()
+    return response.json()
+
+
+@pytest.fixture
+def query_profile():
+    """Every statement the app runs during the test; see sql_debug.QueryProfile."""
+    import sql_debug
+
+    with sql_debug.capture_queries() as profile:
+        yield profile
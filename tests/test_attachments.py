@@ -0,0 +1,101 @@
+import hashlib
+from sqlalchemy import delete, func, select
+import attachments, database, models
+
+
+def upload(client, account, note_id, body, filename="scan.pdf"):
+    return client.post(f"/notes/{note_id}/attachments", params={"filename": filename},
+                       headers=dict(account.headers, **{"Content-Type": "application/pdf"}),
+                       content=body)
+
+
+def new_note(client, account, title="Scans"):
+    return client.post("/notes/create", headers=account.headers, json={
+        "title": title, "content": "", "category_id": account.category_id}).json()
+
+
+def blob_exists(body):
+    return attachments.store.path(hashlib.sha256(body).hexdigest()).exists()
+
+
+async def _blob_rows(body):
+    async with database.SessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(models.AttachmentBlob)
+                               .filter_by(sha256=hashlib.sha256(body).hexdigest()))
+
+
+def test_download_round_trip(client, account, note):
+    body = b"%PDF-1.7 round trip"
+    attachment = upload(client, account, note["id"], body).json()
+    url = f"/notes/{note['id']}/attachments/{attachment['id']}"
+
+    response = client.get(url, headers=account.headers)
+
+    assert response.content == body
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["etag"] == f'"{hashlib.sha256(body).hexdigest()}"'
+    assert client.get(url, headers=dict(account.headers, **{"If-None-Match": response.headers["etag"]})
+                      ).status_code == 304
+    partial = client.get(url, headers=dict(account.headers, Range="bytes=0-3"))
+    assert partial.status_code == 206
+    assert partial.content == b"%PDF"
+
+
+def test_identical_uploads_share_one_blob(client, account, run):
+    body = b"%PDF-1.7 shared between notes"
+    first, second = new_note(client, account, "One"), new_note(client, account, "Two")
+
+    a = upload(client, account, first["id"], body).json()
+    b = upload(client, account, second["id"], body).json()
+
+    assert a["id"] != b["id"]
+    assert run(_blob_rows, body) == 1
+    assert blob_exists(body)
+
+
+def test_shared_blob_is_released_with_its_last_attachment(client, account, run):
+    body = b"%PDF-1.7 released when unused"
+    first, second = new_note(client, account, "One"), new_note(client, account, "Two")
+    a = upload(client, account, first["id"], body).json()
+    upload(client, account, second["id"], body).raise_for_status()
+
+    client.delete(f"/notes/{first['id']}/attachments/{a['id']}",
+                  headers=account.headers).raise_for_status()
+    assert blob_exists(body)
+    assert run(_blob_rows, body) == 1
+
+    client.delete(f"/notes/delete/{second['id']}", headers=account.headers).raise_for_status()
+    assert not blob_exists(body)
+    assert run(_blob_rows, body) == 0
+
+
+def test_oversized_upload_is_rejected(client, account, note, monkeypatch):
+    monkeypatch.setattr(attachments.settings, "attachment_max_size", 8)
+    body = b"%PDF-1.7 too large"
+
+    response = upload(client, account, note["id"], body)
+
+    assert response.status_code == 413
+    assert not blob_exists(body)
+    assert list(attachments.store.incoming.iterdir()) == []
+
+
+async def _attach_while_deleting(note_id, body):
+    async def chunks():
+        yield body[:4]
+        async with database.SessionLocal() as other:
+            await other.execute(delete(models.Notes).filter_by(id=note_id))
+            await other.commit()
+        yield body[4:]
+
+    async with database.SessionLocal() as db:
+        return await attachments.attach(db, note_id, "scan.pdf", "application/pdf", chunks())
+
+
+def test_note_deleted_mid_upload(client, account, note, run):
+    body = b"%PDF-1.7 orphaned upload"
+
+    assert run(_attach_while_deleting, note["id"], body) is None
+    assert not blob_exists(body)
+    assert run(_blob_rows, body) == 0
+    assert list(attachments.store.incoming.iterdir()) == []
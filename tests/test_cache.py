@@ -0,0 +1,21 @@
+import pytest
+import cache
+
+
+def test_principal_cache_backends_must_implement_every_method():
+    class Partial(cache.PrincipalCache):
+        async def get(self, user_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_cache_statistics_are_only_on_metrics(client, account):
+    root = client.get("/").json()
+    metrics = client.get("/metrics").text
+
+    assert "principal_cache" not in root
+    assert "password_hashing" not in root
+    assert 'principal_cache{stat="hits"}' in metrics
+    assert "password_hash_pending" in metrics
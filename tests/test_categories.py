@@ -0,0 +1,38 @@
+def create(client, account, name):
+    return client.post("/category/create", headers=account.headers, json={"category_name": name})
+
+
+def test_create_duplicate_is_a_conflict(client, account):
+    assert create(client, account, "work").status_code == 200
+    response = create(client, account, "work")
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Category already exists"
+
+
+def test_rename_to_an_existing_name_is_a_conflict(client, account):
+    create(client, account, "work")
+    home = create(client, account, "home").json()
+
+    response = client.put(f"/category/edit/{home['id']}", headers=account.headers,
+                          json={"category_name": "work"})
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Category already exists"
+    names = [item["category_name"]
+             for item in client.get("/category/all", headers=account.headers).json()["items"]]
+    assert sorted(names) == ["Home", "Uncategorized", "Work"]
+
+
+def test_default_category_cannot_be_renamed(client, account):
+    response = client.put(f"/category/edit/{account.category_id}", headers=account.headers,
+                          json={"category_name": "inbox"})
+
+    assert response.status_code == 403
+
+
+def test_rename_of_a_missing_category_is_not_found(client, account):
+    response = client.put("/category/edit/999999", headers=account.headers,
+                          json={"category_name": "inbox"})
+
+    assert response.status_code == 404
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+import changefeed, database
+
+_sleep = asyncio.sleep
+
+
+def token(account):
+    return account.headers["Authorization"].removeprefix("Bearer ")
+
+
+def test_websocket_receives_committed_changes(client, account, note):
+    with client.websocket_connect(f"/notes/stream/ws?access_token={token(account)}") as websocket:
+        assert websocket.receive_json() == changefeed.READY
+        client.put(f"/notes/edit/{note['id']}", headers=account.headers,
+                   json={"title": "Shopping"}).raise_for_status()
+        client.delete(f"/notes/delete/{note['id']}", headers=account.headers).raise_for_status()
+
+        assert websocket.receive_json() == {"type": "note.updated", "id": note["id"]}
+        assert websocket.receive_json() == {"type": "note.deleted", "id": note["id"]}
+
+
+async def _publish(user_id, commit):
+    async with changefeed.broker.subscribe(user_id) as subscription:
+        async with database.SessionLocal() as db:
+            changefeed.publish(db, user_id, "note.created", 1, 2)
+            await (db.commit() if commit else db.rollback())
+        return [await subscription.get(0.01) for _ in range(3)]
+
+
+@pytest.mark.parametrize("commit", [True, False])
+def test_events_go_out_only_on_commit(client, run, commit):
+    received = run(_publish, 10**9, commit)
+
+    if commit:
+        assert received == [{"type": "note.created", "id": 1},
+                            {"type": "note.created", "id": 2}, None]
+    else:
+        assert received == [None, None, None]
+
+
+async def _sse(user_id):
+    events = changefeed.sse_events(user_id)
+    first = await anext(events)
+    changefeed.broker.deliver(user_id, [{"type": "note.created", "id": 7}])
+    second = await anext(events)
+    await events.aclose()
+    return first, second
+
+
+def test_sse_framing(client, run):
+    first, second = run(_sse, 10**9 + 1)
+
+    assert first == b'event: ready\ndata: {"type":"ready"}\n\n'
+    assert second == b'event: note.created\ndata: {"type":"note.created","id":7}\n\n'
+
+
+def test_slow_consumer_backlog_becomes_a_resync():
+    async def overflow():
+        subscription = changefeed.Subscription(3)
+        for id in range(5):
+            subscription.put({"type": "note.created", "id": id})
+        return [await subscription.get(0.01) for _ in range(3)]
+
+    assert asyncio.run(overflow()) == [changefeed.RESYNC, {"type": "note.created", "id": 4}, None]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.on_lost = self.on_notify = None
+        self.terminated = False
+
+    def add_termination_listener(self, callback):
+        self.on_lost = lambda: callback(self)
+
+    async def add_listener(self, channel, callback):
+        self.on_notify = lambda payload: callback(self, 1, channel, payload)
+
+    async def execute(self, query):
+        return "SELECT 1"
+
+    def terminate(self):
+        self.terminated = True
+
+
+async def _eventually(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await _sleep(0.005)
+    raise AssertionError("condition not met")
+
+
+def test_listener_survives_failures_and_reconnects(monkeypatch):
+    connections = []
+    failures = [RuntimeError("unexpected"), OSError("refused")]
+
+    async def connect(dsn):
+        if failures:
+            raise failures.pop(0)
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(changefeed.asyncpg, "connect", connect)
+    # No backoff between attempts.
+    monkeypatch.setattr(changefeed.asyncio, "sleep", lambda delay: _sleep(0))
+
+    async def scenario():
+        broker = changefeed.PostgresBroker(10, "postgresql://test", ping_interval=0.01)
+        async with broker.subscribe(5) as subscription:
+            broker.start()
+            await _eventually(lambda: connections)
+            assert await subscription.get(1) == changefeed.RESYNC
+
+            connections[0].on_notify(b'{"user_id": 5, "events": [{"type": "note.created", "id": 3}]}')
+            assert await subscription.get(1) == {"type": "note.created", "id": 3}
+
+            connections[0].on_lost()
+            await _eventually(lambda: len(connections) == 2)
+            assert connections[0].terminated
+            # Events committed while nobody listened are gone: catch up.
+            assert await subscription.get(1) == changefeed.RESYNC
+            await broker.stop()
+        return failures
+
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,94 @@
+import pytest
+
+
+def get_note(client, account, note_id, **headers):
+    return client.get(f"/notes/{note_id}", headers=dict(account.headers, **headers))
+
+
+def edit(client, account, note_id, etag, **changes):
+    return client.put(f"/notes/edit/{note_id}", headers=dict(account.headers, **{"If-Match": etag}),
+                      json=changes)
+
+
+def test_current_etag_is_not_modified(client, account, note):
+    etag = get_note(client, account, note["id"]).headers["ETag"]
+
+    response = get_note(client, account, note["id"], **{"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
+def test_if_none_match_compares_weakly(client, account, note):
+    etag = get_note(client, account, note["id"]).headers["ETag"]
+
+    response = get_note(client, account, note["id"], **{"If-None-Match": f"W/{etag}"})
+
+    assert response.status_code == 304
+
+
+def test_stale_etag_gets_the_note(client, account, note):
+    etag = get_note(client, account, note["id"]).headers["ETag"]
+    edit(client, account, note["id"], etag, content="bread").raise_for_status()
+
+    response = get_note(client, account, note["id"], **{"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json()["content"] == "bread"
+
+
+def test_if_modified_since(client, account, note):
+    last_modified = get_note(client, account, note["id"]).headers["Last-Modified"]
+
+    response = get_note(client, account, note["id"], **{"If-Modified-Since": last_modified})
+
+    assert response.status_code == 304
+
+
+def test_list_is_not_modified_until_a_note_changes(client, account, note):
+    etag = client.get("/notes/all", headers=account.headers).headers["ETag"]
+    headers = dict(account.headers, **{"If-None-Match": etag})
+
+    assert client.get("/notes/all", headers=headers).status_code == 304
+    edit(client, account, note["id"], "*", title="Shopping").raise_for_status()
+    assert client.get("/notes/all", headers=headers).status_code == 200
+
+
+def test_if_match_with_the_current_etag_saves(client, account, note):
+    etag = get_note(client, account, note["id"]).headers["ETag"]
+
+    response = edit(client, account, note["id"], etag, content="bread")
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize("stale", [False, True])
+def test_if_match_rejects_stale_and_weak_tags(client, account, note, stale):
+    etag = get_note(client, account, note["id"]).headers["ETag"]
+    if stale:
+        edit(client, account, note["id"], etag, content="bread").raise_for_status()
+    else:
+        etag = f"W/{etag}"
+
+    response = edit(client, account, note["id"], etag, content="jam")
+
+    assert response.status_code == 412
+    assert get_note(client, account, note["id"]).json()["content"] != "jam"
+
+
+def test_compressed_responses_carry_a_weak_etag(client, account):
+    note = client.post("/notes/create", headers=account.headers, json={
+        "title": "Long", "content": "lorem ipsum " * 500, "category_id": account.category_id}).json()
+
+    compressed = get_note(client, account, note["id"], **{"Accept-Encoding": "gzip"})
+    identity = get_note(client, account, note["id"], **{"Accept-Encoding": "identity"})
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == f"W/{identity.headers['ETag']}"
+    assert get_note(client, account, note["id"], **{"Accept-Encoding": "gzip",
+                                                    "If-None-Match": compressed.headers["ETag"]}
+                    ).status_code == 304
+    assert edit(client, account, note["id"], compressed.headers["ETag"], content="x").status_code == 412
+    assert edit(client, account, note["id"], identity.headers["ETag"], content="x").status_code == 200
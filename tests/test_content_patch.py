@@ -0,0 +1,100 @@
+def fetch(client, account, note_id):
+    response = client.get(f"/notes/{note_id}", headers=account.headers)
+    response.raise_for_status()
+    return response
+
+
+def patch(client, account, note_id, ops, etag=None):
+    headers = dict(account.headers, **({"If-Match": etag} if etag else {}))
+    return client.patch(f"/notes/{note_id}/content", headers=headers, json={"ops": ops})
+
+
+def revision_count(client, account, note_id):
+    return len(client.get(f"/notes/{note_id}/revisions", headers=account.headers).json()["items"])
+
+
+def test_ops_apply_in_order(client, account, note):
+    etag = fetch(client, account, note["id"]).headers["ETag"]
+
+    response = patch(client, account, note["id"], [
+        {"op": "replace", "start": 0, "end": 4, "text": "oat milk"},
+        {"op": "insert", "offset": 8, "text": " (2l)"},
+        {"op": "delete", "start": 13, "end": 14},
+        {"op": "append", "text": ", bread"},
+    ], etag)
+
+    assert response.status_code == 200
+    assert fetch(client, account, note["id"]).json()["content"] == "oat milk (2l) eggs, bread"
+    assert response.json()["content_length"] == len("oat milk (2l) eggs, bread")
+
+
+def test_offsets_count_characters(client, account):
+    note = client.post("/notes/create", headers=account.headers, json={
+        "title": "Café", "content": "crème brûlée", "category_id": account.category_id}).json()
+    etag = fetch(client, account, note["id"]).headers["ETag"]
+
+    patch(client, account, note["id"], [{"op": "replace", "start": 6, "end": 12,
+                                         "text": "caramel"}], etag).raise_for_status()
+
+    assert fetch(client, account, note["id"]).json()["content"] == "crème caramel"
+
+
+def test_patch_bumps_change_seq_and_records_a_revision(client, account, note):
+    before = fetch(client, account, note["id"])
+    revisions_before = revision_count(client, account, note["id"])
+    list_etag = client.get("/notes/all", headers=account.headers).headers["ETag"]
+
+    response = patch(client, account, note["id"], [{"op": "append", "text": ", jam"}],
+                     before.headers["ETag"])
+
+    body = response.json()
+    assert response.headers["ETag"] == f'"n{note["id"]}.{body["change_seq"]}"'
+    assert response.headers["ETag"] != before.headers["ETag"]
+    assert fetch(client, account, note["id"]).headers["ETag"] == response.headers["ETag"]
+    assert revision_count(client, account, note["id"]) > revisions_before
+    latest = client.get(f"/notes/{note['id']}/revisions", headers=account.headers).json()["items"][0]
+    detail = client.get(f"/notes/{note['id']}/revisions/{latest['revision']}",
+                        headers=account.headers).json()
+    assert detail["content"] == "milk, eggs, jam"
+    assert client.get("/notes/all", headers=account.headers).headers["ETag"] != list_etag
+
+
+def test_op_outside_the_content_changes_nothing(client, account, note):
+    before = fetch(client, account, note["id"])
+    revisions_before = revision_count(client, account, note["id"])
+
+    response = patch(client, account, note["id"], [
+        {"op": "append", "text": "!"},
+        {"op": "delete", "start": 5, "end": 50},
+    ], before.headers["ETag"])
+
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith("Op 1:")
+    after = fetch(client, account, note["id"])
+    assert after.json()["content"] == "milk, eggs"
+    assert after.headers["ETag"] == before.headers["ETag"]
+    assert revision_count(client, account, note["id"]) == revisions_before
+
+
+def test_stale_etag_is_a_precondition_failure(client, account, note):
+    etag = fetch(client, account, note["id"]).headers["ETag"]
+    patch(client, account, note["id"], [{"op": "append", "text": "!"}], etag).raise_for_status()
+
+    response = patch(client, account, note["id"], [{"op": "append", "text": "?"}], etag)
+
+    assert response.status_code == 412
+    assert fetch(client, account, note["id"]).json()["content"] == "milk, eggs!"
+
+
+def test_another_notes_etag_is_a_precondition_failure(client, account, note):
+    response = patch(client, account, note["id"], [{"op": "append", "text": "!"}],
+                     f'"n{note["id"] + 1000}.1"')
+
+    assert response.status_code == 412
+
+
+def test_if_match_is_required(client, account, note):
+    response = patch(client, account, note["id"], [{"op": "append", "text": "!"}])
+
+    assert response.status_code == 428
+    assert fetch(client, account, note["id"]).json()["content"] == "milk, eggs"
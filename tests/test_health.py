@@ -0,0 +1,30 @@
+import database, health
+
+
+def test_sqlite_writer_is_probed(client, run):
+    assert health.writer_health is not None
+    assert health.writer_health.engine is database.write_engine
+
+    run(health.writer_health.check)
+
+    assert health.writer_health.status == "ok"
+    assert health.writer_health in health.health_checks()
+
+
+def test_readiness_reports_both_probes(client):
+    body = client.get("/readyz").json()
+
+    assert body["ready"]
+    assert body["database"]["status"] == "ok"
+    assert body["writer"]["status"] == "ok"
+
+
+def test_failing_writer_is_not_ready(client, monkeypatch):
+    monkeypatch.setattr(health.writer_health, "status", "error")
+    monkeypatch.setattr(health.writer_health, "detail", "OperationalError: database is locked")
+
+    response = client.get("/readyz")
+
+    assert response.status_code == 503
+    assert not response.json()["ready"]
+    assert client.get("/").json()["database_status"] == "Error: OperationalError: database is locked"
@@ -0,0 +1,93 @@
+import json
+from sqlalchemy import select
+import database, importer, models
+
+
+def upload(client, account, body, format="ndjson"):
+    return client.post("/notes/import", params={"format": format}, headers=account.headers,
+                       content=body)
+
+
+def ndjson(*records):
+    return b"\n".join(json.dumps(record).encode() for record in records)
+
+
+def notes(client, account):
+    return client.get("/notes/all", headers=account.headers).json()["items"]
+
+
+def test_ndjson_import_reports_bad_rows(client, account):
+    body = ndjson({"title": "One", "content": "first", "category_name": "work"},
+                  {"title": "", "content": "no title"},
+                  {"title": "Two", "content": "second", "bookmark": "maybe"},
+                  {"title": "Three", "content": "third"}) + b"\nnot json\n"
+
+    report = upload(client, account, body).json()
+
+    assert report["rows"] == 5
+    assert report["imported"] == 2
+    assert report["categories_created"] == 1
+    assert [error["line"] for error in report["errors"]] == [2, 3, 5]
+    assert sorted(note["title"] for note in notes(client, account)) == ["One", "Three"]
+
+
+def test_csv_import_keeps_quoted_newlines(client, account):
+    body = b'title,content,category_name\r\nList,"milk\r\neggs",Home\r\n'
+
+    report = upload(client, account, body, format="csv").json()
+
+    assert report["imported"] == 1
+    [note] = notes(client, account)
+    assert note["title"] == "List"
+
+
+def test_import_reuses_existing_categories(client, account):
+    client.post("/category/create", headers=account.headers,
+                json={"category_name": "work"}).raise_for_status()
+
+    report = upload(client, account, ndjson({"title": "One", "content": "x",
+                                             "category_name": "Work"})).json()
+
+    assert report["imported"] == 1
+    assert report["categories_created"] == 0
+
+
+async def _create_categories(email, names):
+    async with database.SessionLocal() as db:
+        user_id = await db.scalar(select(models.Users.id).filter_by(email=email))
+        loader = importer.NoteImporter(db, user_id)
+        await loader._create_categories(names)
+        await db.commit()
+        return loader
+
+
+def test_create_categories_skips_ones_created_meanwhile(client, account, run):
+    # As if another request created "Work" after the importer loaded the categories.
+    existing = client.post("/category/create", headers=account.headers,
+                           json={"category_name": "work"}).json()
+
+    loader = run(_create_categories, account.email, {"Work", "Home"})
+
+    assert loader.categories_created == 1
+    assert loader.categories["Work"] == existing["id"]
+    assert set(loader.categories) == {"Work", "Home"}
+
+
+def test_overlong_line_is_rejected(client, account, monkeypatch):
+    monkeypatch.setattr(importer.settings, "import_max_line", 64)
+    body = ndjson({"title": "One", "content": "x" * 100})
+
+    response = upload(client, account, body)
+
+    assert response.status_code == 413
+    assert notes(client, account) == []
+
+
+def test_oversized_upload_is_rejected(client, account, monkeypatch):
+    monkeypatch.setattr(importer.settings, "import_max_size", 64)
+    body = ndjson(*({"title": f"Note {i}", "content": "x"} for i in range(10)))
+
+    response = upload(client, account, body)
+
+    assert response.status_code == 413
+    assert notes(client, account) == []
@@ -0,0 +1,181 @@
+"""Query-plan regression tests: EXPLAIN the queries behind the hot endpoints, built
+the way the routes build them, on a seeded copy of the schema the migrations
+produce. A query that scans a whole table, stops using the index it was given or
+has to sort fails here, so a dropped or mismatched index fails the build."""
+import json
+import random
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+import database, models
+from pagination import CATEGORY_ORDER, NOTE_ORDER, PageParams, encode_cursor, page_statement
+from ROUTER import category, note
+
+USERS, HEAVY_USER_NOTES, NOTES_PER_USER = 30, 3000, 100
+
+
+class explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(explain, "sqlite")
+def _explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+@compiles(explain, "postgresql")
+def _explain_postgresql(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+class Plan:
+    """The parts of a plan the checks look at, from either backend's EXPLAIN."""
+
+    def __init__(self, dialect: str, rows: list):
+        self.scanned, self.indexes, self.sorts, self.lines = set(), set(), False, []
+        if dialect == "sqlite":
+            for row in rows:
+                detail = row[-1]
+                self.lines.append(detail)
+                words = detail.split()
+                if words[0] == "SCAN" and "USING" not in words:
+                    self.scanned.add(words[1])
+                if "INDEX" in words:
+                    self.indexes.add(words[words.index("INDEX") + 1])
+                self.sorts |= detail.startswith("USE TEMP B-TREE FOR ORDER BY")
+        else:
+            plan = rows[0][0]
+            self._walk((json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"], 0)
+
+    def _walk(self, node: dict, depth: int):
+        self.lines.append("  " * depth + " ".join(
+            str(node[key]) for key in ("Node Type", "Relation Name", "Index Name") if key in node))
+        if node["Node Type"] == "Seq Scan":
+            self.scanned.add(node["Relation Name"])
+        if "Index Name" in node:
+            self.indexes.add(node["Index Name"])
+        self.sorts |= node["Node Type"] in ("Sort", "Incremental Sort")
+        for child in node.get("Plans", []):
+            self._walk(child, depth + 1)
+
+
+class Check:
+    def __init__(self, name: str, build, tables: tuple, index: str = None, ordered: bool = False):
+        self.name, self.build, self.tables = name, build, tables
+        self.index, self.ordered = index, ordered
+
+    def failures(self, plan: Plan) -> list:
+        failures = [f"scans all of {table}" for table in self.tables if table in plan.scanned]
+        if self.index and self.index not in plan.indexes:
+            failures.append(f"does not use {self.index}")
+        if self.ordered and plan.sorts:
+            failures.append("sorts instead of reading the index in order")
+        return failures
+
+
+FIRST_PAGE = PageParams(limit=50, cursor=None)
+NOTES = select(*note.NOTE_LIST_COLUMNS)
+
+CHECKS = [
+    Check("GET /notes/all",
+          lambda data: page_statement(NOTES.filter_by(user_id=data["user_id"]), NOTE_ORDER,
+                                      FIRST_PAGE, descending=True),
+          ("notes",), "ix_notes_user_id_date_modified", ordered=True),
+    Check("GET /notes/all?cursor",
+          lambda data: page_statement(NOTES.filter_by(user_id=data["user_id"]), NOTE_ORDER,
+                                      PageParams(limit=50, cursor=data["cursor"]),
+                                      descending=True),
+          ("notes",), "ix_notes_user_id_date_modified", ordered=True),
+    Check("GET /notes/bookmarks",
+          lambda data: page_statement(NOTES.filter_by(bookmark=True, user_id=data["user_id"]),
+                                      NOTE_ORDER, FIRST_PAGE, descending=True),
+          ("notes",), "ix_notes_user_id_date_modified_bookmarked", ordered=True),
+    Check("GET /category/{id}",
+          lambda data: page_statement(NOTES.filter_by(user_id=data["user_id"],
+                                                      category_id=data["category_id"]),
+                                      NOTE_ORDER, FIRST_PAGE, descending=True),
+          ("notes",), "ix_notes_category_id_date_modified", ordered=True),
+    Check("GET /notes/uncategorized (category lookup)",
+          lambda data: select(models.NoteCategory).filter_by(user_id=data["user_id"],
+                                                             category_name="Uncategorized"),
+          ("note_categories",), "uq_note_categories_user_id_category_name"),
+    Check("GET /category/all",
+          lambda data: page_statement(select(*category.CATEGORY_LIST_COLUMNS)
+                                      .filter_by(user_id=data["user_id"]), CATEGORY_ORDER,
+                                      FIRST_PAGE),
+          ("note_categories",)),
+    Check("GET /notes/{id}",
+          lambda data: select(models.Notes).filter_by(id=1, user_id=data["user_id"]),
+          ("notes",)),
+    Check("POST /user/login",
+          lambda data: select(models.Users).where(models.Users.email == data["email"]),
+          ("users",)),
+    Check("GET /sync/changes",
+          lambda data: select(models.Notes.id)
+          .where(models.Notes.user_id == data["user_id"], models.Notes.change_seq > 0)
+          .order_by(models.Notes.change_seq, models.Notes.id).limit(500),
+          ("notes",), "ix_notes_user_id_change_seq", ordered=True),
+]
+
+
+async def _seed() -> dict:
+    rng = random.Random(1)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    async with database.SessionLocal() as db:
+        user_ids = []
+        for i in range(USERS):
+            user_ids.append(await db.scalar(insert(models.Users).values(
+                username=f"plans{i}", email=f"plans{i}@example.com", password="x")
+                .returning(models.Users.id)))
+        category_ids = {}
+        for user_id in user_ids:
+            category_ids[user_id] = list(await db.scalars(insert(models.NoteCategory).returning(
+                models.NoteCategory.id), [{"user_id": user_id, "category_name": name}
+                                          for name in ("Uncategorized", "Work", "Home")]))
+        rows = []
+        for user_id in user_ids:
+            count = HEAVY_USER_NOTES if user_id == user_ids[0] else NOTES_PER_USER
+            rows += [{"user_id": user_id, "title": f"note {n}", "content": "text",
+                      "category_id": rng.choice(category_ids[user_id]),
+                      "bookmark": rng.random() < 0.1,
+                      "date_modified": start + timedelta(minutes=rng.randint(0, 500_000))}
+                     for n in range(count)]
+        await db.execute(insert(models.Notes), rows)
+        await db.commit()
+
+    async with database.write_engine.connect() as connection:
+        # Fresh statistics, so the planner sees the data as it is now.
+        await connection.execute(text("ANALYZE"))
+        await connection.commit()
+
+    user_id = user_ids[0]
+    async with database.engine.connect() as connection:
+        last_seen = (await connection.execute(select(*NOTE_ORDER).filter_by(user_id=user_id)
+                                              .order_by(*(column.desc() for column in NOTE_ORDER))
+                                              .offset(50).limit(1))).first()
+    return {"user_id": user_id, "email": "plans0@example.com",
+            "category_id": category_ids[user_id][0], "cursor": encode_cursor(list(last_seen))}
+
+
+async def _explain(statement) -> Plan:
+    async with database.engine.connect() as connection:
+        rows = (await connection.execute(explain(statement))).all()
+        return Plan(connection.dialect.name, rows)
+
+
+@pytest.fixture(scope="module")
+def seeded(client):
+    return client.portal.call(_seed)
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=[check.name for check in CHECKS])
+def test_hot_query_uses_its_index(client, seeded, check):
+    plan = client.portal.call(_explain, check.build(seeded))
+
+    failures = check.failures(plan)
+    assert not failures, f"{check.name}: {'; '.join(failures)}\n" + "\n".join(plan.lines)
@@ -0,0 +1,119 @@
+import random
+import pytest
+from sqlalchemy import delete, select
+import database, models, revisions
+import sql_debug
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", ""), ("", "new"), ("old", ""), ("same", "same"), ("abc", "abXc"),
+    ("line 1\nline 2\nline 3\nline 4\n", "line 1\nchanged\nline 3\nline 4\nline 5\n"),
+    ("ünïcødé ✓\nzwei\ndrei\n", "ünïcødé ✗\nzwei\nvier\n"),
+])
+def test_diff_patch_round_trip(old, new):
+    assert revisions.patch(old, revisions.diff(old, new)) == new
+
+
+def test_diff_patch_round_trip_random_edits():
+    rng = random.Random(7)
+    content = "\n".join(f"line {i}" for i in range(200))
+    for _ in range(200):
+        start = rng.randint(0, len(content))
+        end = min(len(content), start + rng.randint(0, 40))
+        edited = content[:start] + "x\n" * rng.randint(0, 3) + content[end:]
+        assert revisions.patch(content, revisions.diff(content, edited)) == edited
+        content = edited
+
+
+def test_diff_stores_only_the_change():
+    old = "a" * 10_000
+    assert revisions.diff(old, old + "b") == [[10_000, 10_000, "b"]]
+
+
+def edit(client, account, note_id, **changes):
+    response = client.put(f"/notes/edit/{note_id}", headers=account.headers, json=changes)
+    assert response.status_code == 200
+    return response
+
+
+def test_edit_note_statement_budget(client, account, note):
+    edit(client, account, note["id"], content="first edit")
+    with sql_debug.capture_queries() as profile:
+        edit(client, account, note["id"], content="second edit")
+
+    statements = [statement for _, statement, _ in profile.queries]
+    # PostgreSQL reads the old row in the UPDATE itself; then the latest revision
+    # and the insert. SQLite reads the old row first (its RETURNING cannot see the
+    # subquery) and re-reads change_seq, which its trigger sets after RETURNING.
+    expected = 5 if database.write_engine.dialect.name == "sqlite" else 3
+    assert profile.count == expected, profile.report()
+    assert sum(statement.startswith("UPDATE notes") for statement in statements) == 1
+    assert sum(statement.startswith("INSERT INTO note_revisions") for statement in statements) == 1
+
+
+def test_every_revision_rebuilds(client, account, note):
+    versions = [note["content"]]
+    content = note["content"]
+    for i in range(40):
+        content = content + f"\nitem {i}" if i % 3 else content.replace("milk", f"milk{i}", 1)
+        edit(client, account, note["id"], content=content)
+        versions.append(content)
+
+    # Revision 1 is the version the note had before its first edit.
+    for revision, expected in enumerate(versions, start=1):
+        response = client.get(f"/notes/{note['id']}/revisions/{revision}",
+                              headers=account.headers)
+        assert response.json()["content"] == expected
+    assert client.get(f"/notes/{note['id']}/revisions/{len(versions) + 1}",
+                      headers=account.headers).status_code == 404
+
+
+async def _revisions(note_id):
+    async with database.SessionLocal() as db:
+        return (await db.execute(select(models.NoteRevision.revision, models.NoteRevision.depth)
+                                 .filter_by(note_id=note_id)
+                                 .order_by(models.NoteRevision.revision))).all()
+
+
+async def _load(note_id, revision):
+    async with database.SessionLocal() as db:
+        return await revisions.load(db, note_id, revision)
+
+
+def test_compaction_keeps_newest_and_rebases_the_chain(client, account, note, run):
+    contents = [f"version {i}\n" * 3 for i in range(12)]
+    for content in contents:
+        edit(client, account, note["id"], content=content)
+
+    assert run(revisions.compact, 5, 0) >= 1
+    kept = run(_revisions, note["id"])
+    assert [row.revision for row in kept] == list(range(9, 14))
+    assert kept[0].depth == 0
+    for row in kept:
+        assert run(_load, note["id"], row.revision)["content"] == contents[row.revision - 2]
+
+
+async def _drop_snapshots(note_id):
+    async with database.SessionLocal() as db:
+        await db.execute(delete(models.NoteRevision)
+                         .filter_by(note_id=note_id, depth=0))
+        await db.commit()
+
+
+async def _compact_note(note_id, keep_from):
+    async with database.SessionLocal() as db:
+        await revisions.compact_note(db, note_id, keep_from)
+        await db.commit()
+
+
+def test_compaction_leaves_a_broken_chain_alone(client, account, note, run):
+    base = "a long enough note that each edit is stored as a delta\n" * 20
+    for i in range(4):
+        edit(client, account, note["id"], content=f"{base}{i}")
+    run(_drop_snapshots, note["id"])
+    before = run(_revisions, note["id"])
+    assert before and before[-1].depth > 0
+
+    run(_compact_note, note["id"], before[-1].revision)
+
+    assert run(_revisions, note["id"]) == before
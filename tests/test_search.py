@@ -0,0 +1,32 @@
+import search
+
+
+def find(client, account, q):
+    response = client.get("/notes/search", params={"q": q}, headers=account.headers)
+    response.raise_for_status()
+    return response.json()["items"]
+
+
+def test_snippet_highlights_the_match(client, account, note):
+    [hit] = find(client, account, "eggs")
+
+    assert hit["id"] == note["id"]
+    assert "<mark>eggs</mark>" in hit["snippet"]
+
+
+def test_snippet_escapes_note_content(client, account):
+    client.post("/notes/create", headers=account.headers, json={
+        "title": "Payload", "content": '<img src=x onerror="alert(1)"> pancakes',
+        "category_id": account.category_id}).raise_for_status()
+
+    [hit] = find(client, account, "pancakes")
+
+    assert "<img" not in hit["snippet"]
+    assert "&lt;img" in hit["snippet"]
+    assert "<mark>pancakes</mark>" in hit["snippet"]
+
+
+def test_highlight_only_emits_mark_tags():
+    snippet = f"a &amp; <b>{search.HIGHLIGHT_START}b{search.HIGHLIGHT_STOP}</b>"
+
+    assert search.highlight(snippet) == "a &amp;amp; &lt;b&gt;<mark>b</mark>&lt;/b&gt;"
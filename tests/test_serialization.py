@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import schemas, serialization
+
+
+@pytest.mark.parametrize("date_created", [
+    datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+    datetime(2026, 1, 2, 3, 4, 5, 120000, tzinfo=timezone(timedelta(hours=-5))),
+    datetime(2026, 1, 2, 3, 4, 5, 7),
+])
+def test_encode_page_matches_pydantic(date_created):
+    page = {"items": [(3, "Groceries", 10, date_created, 3)], "next_cursor": "abc"}
+    validated = {"items": [dict(zip(schemas.RevisionOut.model_fields, page["items"][0]))],
+                 "next_cursor": "abc"}
+
+    assert (serialization.encode_page(schemas.RevisionOut, page)
+            == serialization.dump_json(schemas.Page[schemas.RevisionOut], validated))
+
+
+def test_list_and_detail_agree_on_dates(client, account, note):
+    base = f"/notes/{note['id']}/revisions"
+    client.put(f"/notes/edit/{note['id']}", headers=account.headers,
+               json={"content": "milk"}).raise_for_status()
+
+    listed = client.get(base, headers=account.headers).json()["items"]
+
+    assert listed
+    for item in listed:
+        detail = client.get(f"{base}/{item['revision']}", headers=account.headers).json()
+        assert item["date_created"] == detail["date_created"]
@@ -0,0 +1,20 @@
+import sql_debug
+
+
+def test_fingerprint_folds_literals_and_lists():
+    assert (sql_debug.fingerprint("SELECT * FROM notes WHERE id IN (1, 2, 3) AND title = 'x'")
+            == sql_debug.fingerprint("SELECT * FROM notes WHERE id IN (7) AND title = 'y'"))
+
+
+def test_list_notes_query_budget(client, account, note, query_profile):
+    response = client.get("/notes/all", headers=account.headers)
+
+    assert response.status_code == 200
+    query_profile.assert_max_queries(2)
+    query_profile.assert_no_n_plus_one()
+
+
+def test_profile_counts_statements_not_transactions(client, account, query_profile):
+    client.get("/notes/all", headers=account.headers)
+
+    assert not any(statement.startswith("BEGIN") for _, statement, _ in query_profile.queries)
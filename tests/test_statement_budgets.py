@@ -0,0 +1,57 @@
+"""Each of these edits is a single UPDATE ... RETURNING; a regression to
+read-then-write shows up here as an extra statement."""
+import database
+import sql_debug
+
+# SQLite's RETURNING does not see the change_seq its AFTER trigger sets, so the
+# handlers that return a change_seq read it back there.
+CHANGE_SEQ_REFRESH = 1 if database.write_engine.dialect.name == "sqlite" else 0
+
+
+def statements(profile):
+    return [statement for _, statement, _ in profile.queries]
+
+
+def test_toggle_bookmark(client, account, note):
+    with sql_debug.capture_queries() as profile:
+        response = client.put(f"/notes/bookmark/{note['id']}", headers=account.headers)
+
+    assert response.json()["bookmark"] is True
+    assert profile.count == 1, profile.report()
+    assert statements(profile)[0].startswith("UPDATE notes")
+
+
+def test_edit_user(client, account):
+    with sql_debug.capture_queries() as profile:
+        response = client.put("/user/edit/me", headers=account.headers, json={"username": "renamed"})
+
+    assert response.json()["username"] == "renamed"
+    assert profile.count == 1, profile.report()
+    assert statements(profile)[0].startswith("UPDATE users")
+
+
+def test_edit_category(client, account):
+    created = client.post("/category/create", headers=account.headers,
+                          json={"category_name": "work"}).json()
+    with sql_debug.capture_queries() as profile:
+        response = client.put(f"/category/edit/{created['id']}", headers=account.headers,
+                              json={"category_name": "office"})
+
+    edited = response.json()
+    assert edited["category_name"] == "Office"
+    assert edited["change_seq"] > created["change_seq"]
+    assert "user_id" not in edited
+    assert profile.count == 1 + CHANGE_SEQ_REFRESH, profile.report()
+    assert statements(profile)[0].startswith("UPDATE note_categories")
+
+
+def test_edit_note_writes_the_note_once(client, account, note):
+    # The full budget, revision history included, is pinned in test_revisions.py.
+    with sql_debug.capture_queries() as profile:
+        response = client.put(f"/notes/edit/{note['id']}", headers=account.headers,
+                              json={"title": "Shopping"})
+
+    assert response.json()["title"] == "Shopping"
+    note_writes = [statement for statement in statements(profile)
+                   if statement.startswith(("UPDATE notes", "INSERT INTO notes"))]
+    assert len(note_writes) == 1, profile.report()
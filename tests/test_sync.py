@@ -0,0 +1,54 @@
+import pytest
+from fastapi import HTTPException
+import changes, database
+
+
+def sync(client, account, since=None, **params):
+    response = client.get("/sync/changes", headers=account.headers,
+                          params=dict(params, **({"since": since} if since else {})))
+    response.raise_for_status()
+    return response.json()
+
+
+def test_sync_catches_up_from_a_token(client, account, note):
+    first = sync(client, account)
+    assert [item["id"] for item in first["notes"]] == [note["id"]]
+    assert [item["category_name"] for item in first["categories"]] == ["Uncategorized"]
+    assert sync(client, account, first["next_token"])["notes"] == []
+
+    client.put(f"/notes/edit/{note['id']}", headers=account.headers,
+               json={"title": "Shopping"}).raise_for_status()
+    edited = sync(client, account, first["next_token"])
+    assert [item["title"] for item in edited["notes"]] == ["Shopping"]
+
+    client.delete(f"/notes/delete/{note['id']}", headers=account.headers).raise_for_status()
+    deleted = sync(client, account, edited["next_token"])
+    assert deleted["notes"] == []
+    assert deleted["deleted"] == [{"kind": "note", "id": note["id"]}]
+
+
+def test_sync_pages_with_has_more(client, account, note):
+    page = sync(client, account, limit=1)
+
+    assert page["has_more"]
+    assert len(page["categories"]) + len(page["notes"]) == 1
+    assert not sync(client, account, page["next_token"], limit=10)["has_more"]
+
+
+def test_invalid_token(client, account):
+    response = client.get("/sync/changes", headers=account.headers, params={"since": "garbage"})
+
+    assert response.status_code == 400
+
+
+async def _changes_for_missing_user():
+    async with database.SessionLocal() as db:
+        return await changes.get_changes(db, 10**9, None, 10)
+
+
+def test_deleted_user_is_unauthorized(client, run):
+    # The principal cache can outlive the user row for up to its TTL.
+    with pytest.raises(HTTPException) as raised:
+        run(_changes_for_missing_user)
+
+    assert raised.value.status_code == 401
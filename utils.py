@@ -1,9 +1,100 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from config import settings
+import metrics
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max rounds to the configured cost makes needs_update() flag any hash
+# made with a different cost, so login can rehash it transparently.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", 
+                           bcrypt__default_rounds=settings.bcrypt_rounds,
+                           bcrypt__min_rounds=settings.bcrypt_rounds,
+                           bcrypt__max_rounds=settings.bcrypt_rounds)
 
 def hash(password):
     return pwd_context.hash(password)
 
 def verify(password, hashed_password):
-    return pwd_context.verify(password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(password, hashed_password)
+
+def verify_and_update(password, hashed_password):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+PASSWORD_HASH_SECONDS = metrics.Histogram("password_hash_seconds", 
+                                          "bcrypt time per call, by operation.", ["operation"])
+PASSWORD_HASH_WAIT_SECONDS = metrics.Histogram("password_hash_wait_seconds", 
+                                               "Time spent queued for a hashing thread.")
+
+
+class HashingExecutor:
+    """Runs bcrypt on a dedicated thread pool so a burst of logins cannot take
+    over the threadpool or event loop that serves everything else. bcrypt
+    releases the GIL while hashing, so threads run it in parallel.
+
+    At most `workers + max_queue` calls may be in flight; beyond that callers
+    get a 503 straight away instead of queueing without bound."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.calls = 0
+        self.wait_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.max_hash_seconds = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    @staticmethod
+    def _timed(fn, args):
+        started = time.perf_counter()
+        result = fn(*args)
+        return result, started, time.perf_counter()
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
+                                detail="Server is busy, please retry", 
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            queued_at = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(self._executor, self._timed, 
+                                                                   fn, args)
+        finally:
+            self.pending -= 1
+
+        # Counters are only updated here, on the event loop, so they need no lock.
+        self.calls += 1
+        self.wait_seconds += started - queued_at
+        self.hash_seconds += finished - started
+        self.max_hash_seconds = max(self.max_hash_seconds, finished - started)
+        PASSWORD_HASH_SECONDS.observe(finished - started, fn.__name__)
+        PASSWORD_HASH_WAIT_SECONDS.observe(started - queued_at)
+        return result
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "pending": self.pending, "rejected": self.rejected, 
+                "calls": self.calls, "wait_seconds": self.wait_seconds, 
+                "hash_seconds": self.hash_seconds, "max_hash_seconds": self.max_hash_seconds}
+
+
+hashing_executor = HashingExecutor(settings.hashing_workers, settings.hashing_max_queue)
+metrics.Gauge("password_hash_pending", "Password hashes running or queued.", 
+              collect=lambda: {(): hashing_executor.pending})
+metrics.Counter("password_hash_rejected_total", "Password hashes refused because the queue was full.", 
+                collect=lambda: {(): hashing_executor.rejected})
+
+async def hash_async(password):
+    return await hashing_executor.run(hash, password)
+
+async def verify_async(password, hashed_password):
+    return await hashing_executor.run(verify, password, hashed_password)
+
+async def verify_and_update_async(password, hashed_password):
+    return await hashing_executor.run(verify_and_update, password, hashed_password)
\ No newline at end of file